@@ -0,0 +1,259 @@
+"""
+Armazenamento chave → valor com expiração (TTL).
+
+Usado para estado temporário do login: códigos 2FA enviados e contadores
+de falhas. Antes eram dicts globais em main.py, que cresciam sem limite e
+não eram vistos por outros processos do servidor.
+
+Backends (variável ARMAZENAMENTO no .env):
+- "memoria" (padrão): dict do próprio processo. Entradas vencidas somem
+  na leitura e numa varredura em segundo plano que só visita as vencidas
+  (heap ordenado por expiração).
+- "sqlite": arquivo SQLite compartilhado (ARMAZENAMENTO_SQLITE) com chave
+  primária e índice por expiração. Todos os workers veem os mesmos códigos
+  e bloqueios.
+"""
+from abc import ABC, abstractmethod
+from dotenv import load_dotenv
+import threading
+import sqlite3
+import heapq
+import json
+import time
+import os
+
+load_dotenv()
+
+ARMAZENAMENTO = os.getenv("ARMAZENAMENTO", "memoria")
+ARMAZENAMENTO_SQLITE = os.getenv("ARMAZENAMENTO_SQLITE", "armazenamento.db")
+ARMAZENAMENTO_VARREDURA = float(os.getenv("ARMAZENAMENTO_VARREDURA", 30))  # segundos
+
+
+class ArmazenamentoTTL(ABC):
+    """
+    Interface comum dos backends.
+    - `ttl` é sempre em segundos.
+    - obter() nunca retorna uma entrada vencida.
+    """
+
+    @abstractmethod
+    def obter(self, chave):
+        """Valor guardado na `chave`, ou None se não existe ou venceu."""
+
+    @abstractmethod
+    def definir(self, chave, valor, ttl):
+        """Guarda `valor` (substituindo o anterior) por `ttl` segundos."""
+
+    @abstractmethod
+    def remover(self, chave):
+        """Apaga a `chave` (sem erro se ela não existe)."""
+
+    @abstractmethod
+    def incrementar(self, chave, ttl):
+        """Soma 1 ao contador (começa em 1), renova o TTL e retorna o novo valor."""
+
+    @abstractmethod
+    def varrer(self):
+        """Apaga as entradas vencidas. Retorna quantas foram removidas."""
+
+
+# ==========================
+# 🧠 BACKEND EM MEMÓRIA
+# ==========================
+class ArmazenamentoMemoria(ArmazenamentoTTL):
+    """Dict local com expiração preguiçosa + varredura em O(vencidas)."""
+
+    def __init__(self, intervalo_varredura=ARMAZENAMENTO_VARREDURA):
+        self._dados = {}      # chave -> (valor, expira_em)
+        self._expiracoes = []  # heap de (expira_em, chave)
+        self._lock = threading.Lock()
+        self._intervalo = intervalo_varredura
+        self._pid = None
+
+    def obter(self, chave):
+        self._iniciar_varredura()
+        with self._lock:
+            entrada = self._dados.get(chave)
+            if entrada is None:
+                return None
+            valor, expira_em = entrada
+            if expira_em <= time.monotonic():
+                del self._dados[chave]
+                return None
+            return valor
+
+    def definir(self, chave, valor, ttl):
+        self._iniciar_varredura()
+        expira_em = time.monotonic() + ttl
+        with self._lock:
+            self._dados[chave] = (valor, expira_em)
+            heapq.heappush(self._expiracoes, (expira_em, chave))
+
+    def remover(self, chave):
+        with self._lock:
+            self._dados.pop(chave, None)
+
+    def incrementar(self, chave, ttl):
+        self._iniciar_varredura()
+        agora = time.monotonic()
+        with self._lock:
+            entrada = self._dados.get(chave)
+            valor = 1
+            if entrada is not None and entrada[1] > agora:
+                valor = entrada[0] + 1
+            self._dados[chave] = (valor, agora + ttl)
+            heapq.heappush(self._expiracoes, (agora + ttl, chave))
+            return valor
+
+    def varrer(self):
+        agora = time.monotonic()
+        removidas = 0
+        with self._lock:
+            # O heap está ordenado por expiração: paramos na primeira que
+            # ainda vale. Itens "velhos" (chave renovada depois) são ignorados.
+            while self._expiracoes and self._expiracoes[0][0] <= agora:
+                expira_em, chave = heapq.heappop(self._expiracoes)
+                entrada = self._dados.get(chave)
+                if entrada is not None and entrada[1] == expira_em:
+                    del self._dados[chave]
+                    removidas += 1
+        return removidas
+
+    def __len__(self):
+        return len(self._dados)
+
+    def _iniciar_varredura(self):
+        """Sobe a thread de varredura no processo atual (de novo após fork)."""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+        t = threading.Thread(target=self._loop_varredura, name="varredura-ttl", daemon=True)
+        t.start()
+
+    def _loop_varredura(self):
+        while True:
+            time.sleep(self._intervalo)
+            self.varrer()
+
+
+# ==========================
+# 🗃️ BACKEND SQLITE (COMPARTILHADO)
+# ==========================
+class ArmazenamentoSQLite(ArmazenamentoTTL):
+    """
+    Tabela SQLite compartilhada entre processos.
+    - Busca pela chave primária (espaco, chave).
+    - Índice em `expira` para a varredura apagar só as vencidas.
+    - O arquivo e a tabela só são abertos/criados no primeiro uso: importar
+      o app (ou rodar um comando que não faz login) não toca o disco.
+    """
+
+    def __init__(self, espaco, caminho=ARMAZENAMENTO_SQLITE, intervalo_varredura=ARMAZENAMENTO_VARREDURA):
+        self.espaco = espaco
+        self.caminho = caminho
+        self._intervalo = intervalo_varredura
+        self._local = threading.local()
+        self._pid = None
+        self._lock = threading.Lock()
+        self._tabela_criada = False
+
+    def _conexao(self):
+        """Uma conexão por thread (e por processo). A primeira cria a tabela."""
+        con = getattr(self._local, "con", None)
+        if con is None or getattr(self._local, "pid", None) != os.getpid():
+            con = sqlite3.connect(self.caminho, timeout=5, isolation_level=None)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            if not self._tabela_criada:
+                self._criar_tabela(con)
+            self._local.con = con
+            self._local.pid = os.getpid()
+        return con
+
+    def _criar_tabela(self, con):
+        with self._lock:
+            if self._tabela_criada:
+                return
+            con.execute(
+                "CREATE TABLE IF NOT EXISTS armazenamento_ttl ("
+                " espaco TEXT NOT NULL,"
+                " chave TEXT NOT NULL,"
+                " valor TEXT NOT NULL,"
+                " expira REAL NOT NULL,"
+                " PRIMARY KEY (espaco, chave))"
+            )
+            con.execute("CREATE INDEX IF NOT EXISTS ix_armazenamento_ttl_expira ON armazenamento_ttl (expira)")
+            self._tabela_criada = True
+
+    def obter(self, chave):
+        self._iniciar_varredura()
+        linha = self._conexao().execute(
+            "SELECT valor FROM armazenamento_ttl WHERE espaco = ? AND chave = ? AND expira > ?",
+            (self.espaco, chave, time.time()),
+        ).fetchone()
+        return json.loads(linha[0]) if linha else None
+
+    def definir(self, chave, valor, ttl):
+        self._iniciar_varredura()
+        self._conexao().execute(
+            "INSERT INTO armazenamento_ttl (espaco, chave, valor, expira) VALUES (?, ?, ?, ?)"
+            " ON CONFLICT (espaco, chave) DO UPDATE SET valor = excluded.valor, expira = excluded.expira",
+            (self.espaco, chave, json.dumps(valor), time.time() + ttl),
+        )
+
+    def remover(self, chave):
+        self._conexao().execute(
+            "DELETE FROM armazenamento_ttl WHERE espaco = ? AND chave = ?",
+            (self.espaco, chave),
+        )
+
+    def incrementar(self, chave, ttl):
+        self._iniciar_varredura()
+        agora = time.time()
+        # Upsert atômico: se a entrada venceu, o contador recomeça em 1.
+        linha = self._conexao().execute(
+            "INSERT INTO armazenamento_ttl (espaco, chave, valor, expira) VALUES (?, ?, '1', ?)"
+            " ON CONFLICT (espaco, chave) DO UPDATE SET"
+            "  valor = CASE WHEN expira > ? THEN CAST(valor AS INTEGER) + 1 ELSE 1 END,"
+            "  expira = excluded.expira"
+            " RETURNING valor",
+            (self.espaco, chave, agora + ttl, agora),
+        ).fetchone()
+        return int(linha[0])
+
+    def varrer(self):
+        cursor = self._conexao().execute(
+            "DELETE FROM armazenamento_ttl WHERE espaco = ? AND expira <= ?",
+            (self.espaco, time.time()),
+        )
+        return cursor.rowcount
+
+    def _iniciar_varredura(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+        t = threading.Thread(target=self._loop_varredura, name=f"varredura-{self.espaco}", daemon=True)
+        t.start()
+
+    def _loop_varredura(self):
+        while True:
+            time.sleep(self._intervalo)
+            try:
+                self.varrer()
+            except sqlite3.Error as e:
+                print(f"⚠️ Erro na varredura de '{self.espaco}':", e)
+
+
+def criar_armazenamento(espaco):
+    """Cria o armazenamento do `espaco` com o backend configurado no .env."""
+    if ARMAZENAMENTO == "sqlite":
+        return ArmazenamentoSQLite(espaco)
+    if ARMAZENAMENTO == "memoria":
+        return ArmazenamentoMemoria()
+    raise ValueError(f"ARMAZENAMENTO inválido: {ARMAZENAMENTO!r} (use 'memoria' ou 'sqlite')")
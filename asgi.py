@@ -0,0 +1,294 @@
+"""
+Modo assíncrono (ASGI) do app.
+
+No modo normal (WSGI), cada requisição ocupa uma thread do começo ao fim,
+inclusive enquanto espera o banco ou o bcrypt. Aqui as duas rotas mais
+disputadas, POST / (login) e POST /mfa, rodam como corrotinas:
+- o usuário é buscado pelo driver assíncrono do SQLAlchemy (aiomysql no
+  MySQL, aiosqlite no SQLite);
+- o bcrypt roda no executor de hash (hashing.py) e a corrotina só espera
+  o resultado, sem prender thread;
+- o e-mail do código vai para a fila de fila_email.py, que já envia em
+  segundo plano com conexões SMTP reaproveitadas; com aplicativo
+  autenticador (totp.py), nem isso: o /mfa só calcula o código.
+
+Todo o resto (páginas GET, painel, tickets...) continua no app Flask,
+chamado pelo adaptador WsgiToAsgi do asgiref. As rotas assíncronas rodam
+num contexto de requisição do próprio app (mesma sessão, flash() e
+templates) e usam as mesmas etapas de autenticacao.py que main.py: as
+respostas e os códigos HTTP são os mesmos nos dois modos. As etapas que
+tocam o limitador e o armazenamento de códigos (SQLite com
+ARMAZENAMENTO=sqlite) rodam numa thread, fora do loop de eventos.
+
+Uso (dependências: pip install asgiref uvicorn aiosqlite ou aiomysql):
+    python asgi.py                      # ASGI_HOST, ASGI_PORT, ASGI_WORKERS
+    uvicorn asgi:app --workers 4
+"""
+from urllib.parse import unquote
+from flask import session, redirect, url_for
+from flask.ctx import RequestContext
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+from werkzeug.wrappers import Response
+from werkzeug.middleware.proxy_fix import ProxyFix
+from database import DATABASE_URL, DB_ECHO
+from hashing import verificar_senha_async, FilaHashCheia
+from sessoes import SessaoSQLInterface
+import autenticacao
+import totp
+from dotenv import load_dotenv
+import asyncio
+import io
+import os
+
+try:
+    from asgiref.wsgi import WsgiToAsgi
+except ImportError as e:
+    raise ImportError("O modo ASGI precisa do asgiref: pip install asgiref uvicorn aiosqlite") from e
+
+import main
+
+load_dotenv()
+
+ASGI_HOST = os.getenv("ASGI_HOST", "127.0.0.1")
+ASGI_PORT = int(os.getenv("ASGI_PORT", 8000))
+ASGI_WORKERS = int(os.getenv("ASGI_WORKERS", 1))
+ASGI_CORPO_MAX = int(os.getenv("ASGI_CORPO_MAX", 64 * 1024))  # bytes aceitos no formulário
+
+# Driver assíncrono para cada banco (o síncrono continua no database.py)
+DRIVERS_ASYNC = {"mysql": "mysql+aiomysql", "sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
+
+flask_app = main.app
+
+# As rotas assíncronas não passam pelo app.wsgi_app: aplicam o mesmo
+# ProxyFix (PROXY_SALTOS) no environ, para o limitador ver o mesmo IP
+_proxy = None
+if main.PROXY_SALTOS:
+    _proxy = ProxyFix(lambda environ, start_response: environ, x_for=main.PROXY_SALTOS, x_proto=main.PROXY_SALTOS)
+
+
+# ==========================
+# 🗄️ BANCO ASSÍNCRONO
+# ==========================
+def url_async(url=DATABASE_URL):
+    """Troca o driver da DATABASE_URL pelo equivalente assíncrono."""
+    if os.getenv("ASYNC_DATABASE_URL"):
+        return os.getenv("ASYNC_DATABASE_URL")
+    url = make_url(url)
+    driver = DRIVERS_ASYNC.get(url.get_backend_name())
+    return url.set(drivername=driver) if driver else url
+
+
+_engine_async = None
+
+
+def obter_engine_async():
+    """Engine assíncrona do processo (criada no primeiro uso, já dentro do loop)."""
+    global _engine_async
+    if _engine_async is None:
+        _engine_async = create_async_engine(url_async(), echo=DB_ECHO, pool_pre_ping=True)
+    return _engine_async
+
+
+async def buscar_usuario(email):
+    """Mesma consulta do login síncrono (autenticacao.consulta_usuario), pelo driver assíncrono."""
+    async with obter_engine_async().connect() as conn:
+        resultado = await conn.execute(autenticacao.consulta_usuario(email))
+        return resultado.first()
+
+
+async def usar_passo_totp(usuario_id, passo):
+    """Consome o código TOTP (UPDATE condicional). False se já foi usado."""
+    async with obter_engine_async().begin() as conn:
+        resultado = await conn.execute(totp.comando_uso(usuario_id, passo))
+        return resultado.rowcount == 1
+
+
+# ==========================
+# 🍪 REQUISIÇÃO, RESPOSTA E SESSÃO
+# ==========================
+def _environ(scope, corpo):
+    """Monta um environ WSGI a partir do scope ASGI (para o contexto de requisição do Flask)."""
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", ""),
+        "PATH_INFO": unquote(scope["path"]),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(corpo),
+        "wsgi.errors": io.StringIO(),
+        "CONTENT_LENGTH": str(len(corpo)),
+    }
+    servidor = scope.get("server") or ("localhost", 80)
+    environ["SERVER_NAME"], environ["SERVER_PORT"] = servidor[0], str(servidor[1])
+    if scope.get("client"):
+        environ["REMOTE_ADDR"] = scope["client"][0]
+    for nome, valor in scope.get("headers", []):
+        nome = nome.decode("latin-1").upper().replace("-", "_")
+        valor = valor.decode("latin-1")
+        if nome == "CONTENT_TYPE":
+            environ["CONTENT_TYPE"] = valor
+        elif nome != "CONTENT_LENGTH":
+            chave = f"HTTP_{nome}"
+            environ[chave] = f"{environ[chave]},{valor}" if chave in environ else valor
+    return environ
+
+
+async def _ler_corpo(receive):
+    """Lê o corpo inteiro; retorna None se passar de ASGI_CORPO_MAX."""
+    corpo = bytearray()
+    while True:
+        mensagem = await receive()
+        corpo += mensagem.get("body", b"")
+        if len(corpo) > ASGI_CORPO_MAX:
+            return None
+        if not mensagem.get("more_body"):
+            return bytes(corpo)
+
+
+async def _enviar(send, resposta):
+    await send({
+        "type": "http.response.start",
+        "status": resposta.status_code,
+        "headers": [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in resposta.headers.items()],
+    })
+    await send({"type": "http.response.body", "body": resposta.get_data()})
+
+
+async def _rodar(funcao, *args):
+    """A sessão em cookie é só CPU; a do banco (SESSAO_BACKEND=sql) vai para uma thread."""
+    if isinstance(flask_app.session_interface, SessaoSQLInterface):
+        return await asyncio.to_thread(funcao, *args)
+    return funcao(*args)
+
+
+def rota_async(funcao):
+    """
+    Envolve uma rota assíncrona num contexto de requisição do Flask: dentro
+    dela (e das threads abertas com asyncio.to_thread, que herdam o
+    contexto) request, session, flash() e render_template() funcionam como
+    numa view. A rota recebe o request e retorna o mesmo que uma view.
+    """
+    async def asgi(scope, receive, send):
+        corpo = await _ler_corpo(receive)
+        if corpo is None:
+            await _enviar(send, Response("Formulário grande demais.", status=413))
+            return
+        environ = _environ(scope, corpo)
+        if _proxy is not None:
+            environ = _proxy(environ, None)
+        request = flask_app.request_class(environ)
+        # Abre a sessão antes do push (no backend SQL isso vai ao banco)
+        interface = flask_app.session_interface
+        sessao = await _rodar(interface.open_session, flask_app, request)
+        if sessao is None:
+            sessao = interface.make_null_session(flask_app)
+        contexto = RequestContext(flask_app, environ, request=request, session=sessao)
+        contexto.push()
+        try:
+            # before_request (métricas, Server-Timing, purga) numa thread: pode ir ao banco
+            resposta = await asyncio.to_thread(flask_app.preprocess_request)
+            if resposta is None:
+                resposta = await funcao(contexto.request)
+            resposta = flask_app.make_response(resposta)
+            # after_request + gravação da sessão, como no Flask
+            resposta = await _rodar(flask_app.process_response, resposta)
+        finally:
+            contexto.pop()
+        await _enviar(send, resposta)
+    return asgi
+
+
+# ==========================
+# 🔐 ROTAS ASSÍNCRONAS
+# ==========================
+# Mesmo fluxo de main.login() e main.mfa(), com as etapas de autenticacao.py.
+# Só a busca do usuário, o bcrypt e o consumo do código TOTP usam await.
+@rota_async
+async def login(request):
+    email = request.form.get("email", "").lower()
+    senha = request.form.get("senha", "")
+    ip = autenticacao.ip_cliente()
+
+    bloqueio = await asyncio.to_thread(autenticacao.resposta_bloqueio, email, ip)
+    if bloqueio is not None:
+        return bloqueio
+
+    usuario = await buscar_usuario(email)
+    try:
+        senha_ok = usuario is not None and await verificar_senha_async(senha, usuario.hash_senha)
+    except FilaHashCheia:
+        return autenticacao.resposta_ocupado()
+
+    if not senha_ok:
+        return await asyncio.to_thread(autenticacao.resposta_senha_incorreta, usuario, email, ip)
+    return await asyncio.to_thread(autenticacao.concluir_login, usuario, email, senha, ip)
+
+
+@rota_async
+async def mfa(request):
+    email_temp = session.get("email_temp")
+    if not email_temp:
+        return redirect(url_for("login"))
+
+    ip = autenticacao.ip_cliente()
+    codigo = request.form.get("codigo", "")
+    if session.get("mfa_totp"):
+        bloqueio = await asyncio.to_thread(autenticacao.resposta_bloqueio_mfa, email_temp, ip)
+        if bloqueio is not None:
+            return bloqueio
+        usuario = await buscar_usuario(email_temp)
+        passo = autenticacao.passo_totp(usuario, codigo)
+        if passo and await usar_passo_totp(usuario.id, passo):
+            return await asyncio.to_thread(autenticacao.concluir_mfa_totp, usuario, email_temp, ip)
+        return await asyncio.to_thread(autenticacao.resposta_totp_incorreto, usuario, email_temp, ip)
+
+    erro = await asyncio.to_thread(autenticacao.conferir_codigo_email, email_temp, codigo, ip)
+    if erro is not None:
+        return erro
+    usuario = await buscar_usuario(email_temp)
+    return await asyncio.to_thread(autenticacao.concluir_mfa_email, usuario, email_temp, ip)
+
+
+ROTAS_ASYNC = {("POST", "/"): login, ("POST", "/mfa"): mfa}
+
+
+# ==========================
+# 🚀 APLICAÇÃO ASGI
+# ==========================
+_wsgi = WsgiToAsgi(flask_app)
+
+
+async def app(scope, receive, send):
+    """Rotas assíncronas acima; todo o resto vai para o app Flask."""
+    if scope["type"] == "lifespan":
+        await _ciclo_de_vida(receive, send)
+        return
+    if scope["type"] == "http":
+        rota = ROTAS_ASYNC.get((scope["method"], scope["path"]))
+        if rota is not None:
+            await rota(scope, receive, send)
+            return
+    await _wsgi(scope, receive, send)
+
+
+async def _ciclo_de_vida(receive, send):
+    while True:
+        mensagem = await receive()
+        if mensagem["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif mensagem["type"] == "lifespan.shutdown":
+            if _engine_async is not None:
+                await _engine_async.dispose()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+if __name__ == "__main__":
+    try:
+        import uvicorn
+    except ImportError as e:
+        raise SystemExit("Instale o uvicorn para rodar o modo ASGI: pip install uvicorn") from e
+    # O IP real vem do ProxyFix (PROXY_SALTOS), como no modo WSGI
+    uvicorn.run("asgi:app", host=ASGI_HOST, port=ASGI_PORT, workers=ASGI_WORKERS, proxy_headers=False)
@@ -0,0 +1,183 @@
+"""
+Build dos arquivos estáticos (CSS) com nome versionado e pré-compressão.
+
+Para cada arquivo de ASSETS:
+- minifica (tira comentários e espaços sobrando);
+- grava em static/dist/ com o hash do conteúdo no nome
+  (style.css → style.3f2a9c1b7d4e.css);
+- gera as versões .gz e, se o pacote `brotli` estiver instalado, .br;
+- registra o nome final em static/dist/manifest.json.
+
+Nos templates use asset_url('style.css') no lugar de
+url_for('static', filename='style.css'). Como o nome muda sempre que o
+conteúdo muda, os arquivos de dist/ são servidos com cache de 1 ano
+("immutable"): o navegador nem pergunta de novo ao servidor, e recarregar
+a página não transfere nenhum byte de CSS.
+
+O build é um passo do deploy: `flask --app main construir-assets`. O app
+não grava nada em static/ ao subir; só lê o manifesto. Sem manifesto, ou
+com um arquivo de origem mais novo que ele (editando o CSS em
+desenvolvimento), asset_url() devolve o arquivo original, sem versão.
+
+Cada build apaga de dist/ os arquivos que não estão no manifesto novo nem
+no anterior: workers da versão anterior, ainda no ar durante a troca,
+continuam achando o CSS deles.
+"""
+from flask import url_for, request, send_from_directory, abort
+import mimetypes
+import hashlib
+import json
+import gzip
+import os
+import re
+
+try:
+    import brotli  # opcional: pip install brotli
+except ImportError:
+    brotli = None
+
+ASSETS = ["style.css"]
+ASSETS_PASTA = "dist"  # dentro de static/
+ASSETS_CACHE_SEGUNDOS = 365 * 24 * 3600
+
+_STRINGS_CSS = re.compile(r"""("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')""")
+_COMENTARIOS_CSS = re.compile(r"/\*.*?\*/", re.S)
+
+
+def minificar_css(texto):
+    """Minificação simples e segura: comentários, espaços e ';' finais."""
+    texto = _COMENTARIOS_CSS.sub("", texto)
+    partes = _STRINGS_CSS.split(texto)
+    for i in range(0, len(partes), 2):  # posições ímpares são strings: ficam como estão
+        trecho = re.sub(r"\s+", " ", partes[i])
+        trecho = re.sub(r"\s*([{};,>])\s*", r"\1", trecho)
+        trecho = re.sub(r":\s+", ":", trecho)
+        partes[i] = trecho.replace(";}", "}")
+    return "".join(partes).strip()
+
+
+# ==========================
+# 🏗️ BUILD
+# ==========================
+def construir(pasta_static):
+    """Gera static/dist/ e o manifesto. Retorna {nome original: nome versionado}."""
+    destino = os.path.join(pasta_static, ASSETS_PASTA)
+    os.makedirs(destino, exist_ok=True)
+    manifesto = {}
+
+    for nome in ASSETS:
+        with open(os.path.join(pasta_static, nome), encoding="utf-8") as arquivo:
+            conteudo = arquivo.read()
+        if nome.endswith(".css"):
+            conteudo = minificar_css(conteudo)
+        dados = conteudo.encode("utf-8")
+
+        base, extensao = os.path.splitext(nome)
+        versionado = f"{base}.{hashlib.sha256(dados).hexdigest()[:12]}{extensao}"
+        caminho = os.path.join(destino, versionado)
+        _gravar(caminho, dados)
+        _gravar(caminho + ".gz", gzip.compress(dados, compresslevel=9, mtime=0))
+        if brotli is not None:
+            _gravar(caminho + ".br", brotli.compress(dados, quality=11))
+        manifesto[nome] = versionado
+
+    anterior = _ler_manifesto(destino)
+    _gravar(os.path.join(destino, "manifest.json"), json.dumps(manifesto, indent=2).encode("utf-8"))
+    _limpar(destino, set(manifesto.values()) | set(anterior.values()))
+    return manifesto
+
+
+def _limpar(destino, manter):
+    """Apaga os arquivos versionados (e .gz/.br) que não estão em `manter`."""
+    for nome in os.listdir(destino):
+        if nome == "manifest.json" or nome.endswith(".tmp"):
+            continue
+        original = nome.removesuffix(".gz").removesuffix(".br")
+        if original not in manter:
+            os.remove(os.path.join(destino, nome))
+
+
+def _ler_manifesto(destino):
+    try:
+        with open(os.path.join(destino, "manifest.json"), encoding="utf-8") as arquivo:
+            return json.load(arquivo)
+    except (OSError, ValueError):
+        return {}
+
+
+def _gravar(caminho, dados):
+    """Escreve num temporário e renomeia: outro worker nunca lê arquivo pela metade."""
+    temporario = f"{caminho}.{os.getpid()}.tmp"
+    with open(temporario, "wb") as arquivo:
+        arquivo.write(dados)
+    os.replace(temporario, caminho)
+
+
+def _carregar_manifesto(pasta_static):
+    """
+    Lê o manifesto (sem build). Arquivos cuja origem é mais nova que o
+    manifesto ficam de fora: asset_url() usa o original até o próximo build.
+    """
+    destino = os.path.join(pasta_static, ASSETS_PASTA)
+    manifesto = _ler_manifesto(destino)
+    try:
+        gerado_em = os.path.getmtime(os.path.join(destino, "manifest.json"))
+    except OSError:
+        return {}
+    return {
+        nome: versionado for nome, versionado in manifesto.items()
+        if os.path.exists(os.path.join(pasta_static, nome))
+        and os.path.getmtime(os.path.join(pasta_static, nome)) <= gerado_em
+    }
+
+
+# ==========================
+# 🔌 LIGAÇÃO COM O APP
+# ==========================
+def init_assets(app):
+    """
+    - asset_url() nos templates;
+    - rota /static/dist/... com cache de 1 ano e .br/.gz conforme o navegador aceitar;
+    - comando `flask construir-assets` (no deploy; o boot só lê o manifesto).
+    """
+    pasta_dist = os.path.join(app.static_folder, ASSETS_PASTA)
+    manifesto = _carregar_manifesto(app.static_folder)
+
+    @app.template_global()
+    def asset_url(nome):
+        """URL versionada do arquivo (ou a normal, se ele não estiver no build)."""
+        versionado = manifesto.get(nome)
+        if versionado is None:
+            return url_for("static", filename=nome)
+        return url_for("asset", nome=versionado)
+
+    @app.route(f"{app.static_url_path}/{ASSETS_PASTA}/<path:nome>", endpoint="asset")
+    def servir_asset(nome):
+        if nome not in manifesto.values():
+            abort(404)
+
+        tipo = mimetypes.guess_type(nome)[0] or "application/octet-stream"
+        codificacao = None
+        for extensao, nome_codificacao in ((".br", "br"), (".gz", "gzip")):
+            if request.accept_encodings[nome_codificacao] and os.path.exists(os.path.join(pasta_dist, nome + extensao)):
+                codificacao = nome_codificacao
+                nome += extensao
+                break
+
+        resposta = send_from_directory(pasta_dist, nome, mimetype=tipo, max_age=ASSETS_CACHE_SEGUNDOS)
+        resposta.cache_control.public = True
+        resposta.cache_control.immutable = True
+        resposta.vary.add("Accept-Encoding")
+        if codificacao:
+            resposta.headers["Content-Encoding"] = codificacao
+        return resposta
+
+    @app.cli.command("construir-assets")
+    def comando_construir_assets():
+        """Minifica, versiona e comprime os arquivos estáticos (e apaga os antigos)."""
+        manifesto.clear()
+        manifesto.update(construir(app.static_folder))
+        for nome, versionado in manifesto.items():
+            print(f"✅ {nome} → {ASSETS_PASTA}/{versionado}")
+        if brotli is None:
+            print("ℹ️ Pacote 'brotli' não instalado: só a versão .gz foi gerada.")
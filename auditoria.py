@@ -0,0 +1,213 @@
+"""
+Log de auditoria de segurança (login, 2FA e conta).
+
+Falhas de login, bloqueios, envios de código e exclusões de conta só
+apareciam em print() ou nos contadores em memória. Agora cada evento vira
+uma linha em 'eventos_auditoria', sem custar um COMMIT por requisição:
+- registrar() só coloca o evento numa fila em memória e retorna (nunca
+  espera o banco);
+- uma thread em segundo plano grava em lote: quando junta AUDITORIA_LOTE
+  eventos ou a cada AUDITORIA_INTERVALO segundos, o que vier primeiro,
+  num único INSERT;
+- a fila tem tamanho máximo (AUDITORIA_FILA_MAX). Se o banco não der
+  conta e ela encher, os eventos novos são descartados e contados em
+  metricas()["descartados"]: o login nunca fica esperando a auditoria;
+- consultar() busca por usuário, tipo e período (tabela indexada);
+  na linha de comando: `flask --app main auditoria --email x@y.com`.
+"""
+from datetime import datetime, timedelta
+from sqlalchemy import select, insert
+from database import EventoAuditoria, obter_engine
+from dotenv import load_dotenv
+import threading
+import atexit
+import click
+import queue
+import json
+import time
+import os
+
+load_dotenv()
+
+AUDITORIA_FILA_MAX = int(os.getenv("AUDITORIA_FILA_MAX", 10000))
+AUDITORIA_LOTE = int(os.getenv("AUDITORIA_LOTE", 500))
+AUDITORIA_INTERVALO = float(os.getenv("AUDITORIA_INTERVALO", 1.0))  # segundos
+
+# --- Tipos de evento ---
+LOGIN_OK = "login_ok"
+LOGIN_FALHA = "login_falha"
+LOGIN_BLOQUEADO = "login_bloqueado"
+MFA_ENVIADO = "mfa_enviado"
+MFA_OK = "mfa_ok"
+MFA_FALHA = "mfa_falha"
+TWOFA_ALTERADO = "2fa_alterado"
+TOTP_ATIVADO = "totp_ativado"
+TOTP_REMOVIDO = "totp_removido"
+CONTA_EXCLUIDA = "conta_excluida"
+EXCLUSAO_FALHA = "exclusao_falha"
+
+
+class RegistroAuditoria:
+    """
+    Fila limitada de eventos + gravador em lote.
+    O gravador é criado no primeiro evento de cada processo.
+    """
+
+    def __init__(self, fila_max=AUDITORIA_FILA_MAX, lote=AUDITORIA_LOTE, intervalo=AUDITORIA_INTERVALO):
+        self.lote = lote
+        self.intervalo = intervalo
+        self._fila = queue.Queue(maxsize=fila_max)
+        self._lock = threading.Lock()
+        self._pid = None
+
+        # --- Métricas ---
+        self._registrados = 0
+        self._gravados = 0
+        self._descartados = 0
+        self._lotes = 0
+        self._falhas = 0
+
+    # ---------------- API PÚBLICA -----------------
+    def registrar(self, tipo, usuario_id=None, email=None, ip=None, **detalhes):
+        """Enfileira o evento e retorna na hora. False se a fila estava cheia."""
+        evento = {
+            "criado_em": datetime.now(),
+            "tipo": tipo,
+            "usuario_id": usuario_id,
+            "email": email,
+            "ip": ip,
+            "detalhes": json.dumps(detalhes, ensure_ascii=False, default=str) if detalhes else None,
+        }
+        self._iniciar()
+        try:
+            self._fila.put_nowait(evento)
+        except queue.Full:
+            with self._lock:
+                self._descartados += 1
+            return False
+        with self._lock:
+            self._registrados += 1
+        return True
+
+    def esvaziar(self, timeout=10):
+        """
+        Espera os eventos da fila serem gravados. Retorna True se esvaziou.
+        Conta como a Queue.join(): um evento só sai da conta no task_done()
+        do gravador, depois do INSERT (tirar da fila não basta).
+        """
+        with self._fila.all_tasks_done:
+            return self._fila.all_tasks_done.wait_for(lambda: not self._fila.unfinished_tasks, timeout)
+
+    def metricas(self):
+        with self._lock:
+            return {
+                "na_fila": self._fila.qsize(),
+                "registrados": self._registrados,
+                "gravados": self._gravados,
+                "descartados": self._descartados,
+                "lotes": self._lotes,
+                "falhas_gravacao": self._falhas,
+            }
+
+    # ---------------- GRAVADOR -----------------
+    def _iniciar(self):
+        """Cria o gravador do processo atual (de novo após um fork)."""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            threading.Thread(target=self._loop, name="auditoria", daemon=True).start()
+            if self._pid is None:
+                atexit.register(self.esvaziar, 2)  # grava o que sobrou ao encerrar
+            self._pid = os.getpid()
+
+    def _pegar_lote(self):
+        """Bloqueia pelo primeiro evento; junta mais até `lote` ou `intervalo`."""
+        eventos = [self._fila.get()]
+        prazo = time.monotonic() + self.intervalo
+        while len(eventos) < self.lote:
+            restante = prazo - time.monotonic()
+            if restante <= 0:
+                break
+            try:
+                eventos.append(self._fila.get(timeout=restante))
+            except queue.Empty:
+                break
+        return eventos
+
+    def _loop(self):
+        while True:
+            eventos = self._pegar_lote()
+            try:
+                with obter_engine().begin() as conn:
+                    conn.execute(insert(EventoAuditoria), eventos)
+                with self._lock:
+                    self._gravados += len(eventos)
+                    self._lotes += 1
+            except Exception as e:
+                # Sem retentativa: o banco fora do ar não pode encher a memória
+                print(f"⚠️ Auditoria: {len(eventos)} eventos perdidos:", e)
+                with self._lock:
+                    self._falhas += len(eventos)
+            finally:
+                for _ in eventos:
+                    self._fila.task_done()
+
+
+# --- Instância única usada pelas rotas ---
+registro_auditoria = RegistroAuditoria()
+
+
+def auditar(tipo, usuario_id=None, email=None, ip=None, **detalhes):
+    """Registra um evento de auditoria (não bloqueia; veja RegistroAuditoria)."""
+    return registro_auditoria.registrar(tipo, usuario_id, email, ip, **detalhes)
+
+
+def consultar(usuario_id=None, email=None, tipo=None, desde=None, ate=None, limite=100):
+    """
+    Eventos mais recentes primeiro, filtrados por usuário (id ou e-mail),
+    tipo (um ou uma lista) e período [desde, ate). Retorna dicionários.
+    """
+    consulta = select(EventoAuditoria.__table__)
+    if usuario_id is not None:
+        consulta = consulta.where(EventoAuditoria.usuario_id == usuario_id)
+    if email is not None:
+        consulta = consulta.where(EventoAuditoria.email == email)
+    if tipo is not None:
+        tipos = [tipo] if isinstance(tipo, str) else list(tipo)
+        consulta = consulta.where(EventoAuditoria.tipo.in_(tipos))
+    if desde is not None:
+        consulta = consulta.where(EventoAuditoria.criado_em >= desde)
+    if ate is not None:
+        consulta = consulta.where(EventoAuditoria.criado_em < ate)
+    consulta = consulta.order_by(EventoAuditoria.criado_em.desc(), EventoAuditoria.id.desc()).limit(limite)
+
+    with obter_engine().connect() as conn:
+        linhas = conn.execute(consulta).mappings().all()
+    eventos = []
+    for linha in linhas:
+        evento = dict(linha)
+        evento["detalhes"] = json.loads(evento["detalhes"]) if evento["detalhes"] else {}
+        eventos.append(evento)
+    return eventos
+
+
+def registrar_comando_auditoria(app):
+    """Registra `flask auditoria` (consulta pela linha de comando)."""
+
+    @app.cli.command("auditoria")
+    @click.option("--usuario", "usuario_id", type=int, help="ID do usuário.")
+    @click.option("--email", help="E-mail usado no evento.")
+    @click.option("--tipo", multiple=True, help="Tipo do evento (pode repetir).")
+    @click.option("--horas", type=float, default=24, show_default=True, help="Período, a partir de agora.")
+    @click.option("--limite", type=int, default=50, show_default=True)
+    def comando_auditoria(usuario_id, email, tipo, horas, limite):
+        """Mostra os eventos de auditoria mais recentes."""
+        eventos = consultar(usuario_id, email, tipo or None, datetime.now() - timedelta(hours=horas), None, limite)
+        for evento in eventos:
+            detalhes = " ".join(f"{chave}={valor}" for chave, valor in evento["detalhes"].items())
+            print(f"{evento['criado_em']:%Y-%m-%d %H:%M:%S}  {evento['tipo']:<16} "
+                  f"usuario={evento['usuario_id'] or '-'} email={evento['email'] or '-'} "
+                  f"ip={evento['ip'] or '-'} {detalhes}")
+        print(f"— {len(eventos)} eventos")
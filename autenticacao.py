@@ -0,0 +1,231 @@
+"""
+Etapas do login e do 2FA, usadas pelas duas portas de entrada do app:
+as rotas de main.py (WSGI) e as rotas assíncronas de asgi.py.
+
+Cada etapa roda dentro de um contexto de requisição do Flask (request,
+session, flash() e render_template() funcionam) e devolve a resposta da
+etapa, ou None quando o fluxo deve continuar. Assim as mensagens, os
+códigos HTTP (429 bloqueado, 503 servidor ocupado), o limitador, a
+auditoria e as regras do 2FA existem num lugar só.
+
+confirmar_identidade() é a mesma checagem (senha ou código do aplicativo)
+para as configurações que enfraquecem a conta.
+
+Ficam fora daqui só os passos que cada porta faz do seu jeito: buscar o
+usuário (consulta_usuario() é a mesma; o driver muda), conferir a senha
+(executor de hash, síncrono ou com await) e consumir o código TOTP
+(totp.comando_uso()). As etapas tocam o armazenamento de estado (SQLite
+com ARMAZENAMENTO=sqlite), então o asgi.py as chama numa thread.
+"""
+from flask import render_template, request, redirect, url_for, session, flash
+from sqlalchemy import select
+from database import Usuario
+from hashing import verificar_senha, precisa_rehash, rehash_em_segundo_plano
+from fila_email import enviar_email
+from armazenamento import criar_armazenamento
+from limitador import LimitadorJanela
+from cache_paginas import renderizar_pagina
+from auditoria import auditar
+import auditoria
+import totp
+import random
+import os
+
+# Estado temporário com expiração automática (veja armazenamento.py).
+# Com ARMAZENAMENTO=sqlite, todos os processos do servidor compartilham os dados.
+codigos_2fa = criar_armazenamento("codigos_2fa")    # códigos enviados por e-mail
+falhas_login = criar_armazenamento("falhas_login")  # contadores do limitador de login
+
+# Limites de falhas de login por janela deslizante (veja limitador.py).
+# O bloqueio diminui sozinho conforme a janela passa.
+LIMITE_FALHAS = int(os.getenv("LOGIN_LIMITE_EMAIL", 5))          # por e-mail
+JANELA_FALHAS_EMAIL = int(os.getenv("LOGIN_JANELA_EMAIL", 900))  # segundos
+LIMITE_FALHAS_IP = int(os.getenv("LOGIN_LIMITE_IP", 20))         # por IP (qualquer e-mail)
+JANELA_FALHAS_IP = int(os.getenv("LOGIN_JANELA_IP", 300))        # segundos
+limite_email = LimitadorJanela(falhas_login, "email", LIMITE_FALHAS, JANELA_FALHAS_EMAIL)
+limite_ip = LimitadorJanela(falhas_login, "ip", LIMITE_FALHAS_IP, JANELA_FALHAS_IP)
+
+CODIGO_EXPIRA_MINUTOS = 5  # tempo de validade do código enviado por e-mail
+
+
+def ip_cliente():
+    """
+    IP de quem fez a requisição (limitador e auditoria). Atrás de proxy, o
+    ProxyFix do main.py (PROXY_SALTOS) já trocou remote_addr pelo IP real,
+    nas rotas WSGI e nas assíncronas do asgi.py.
+    """
+    return request.remote_addr or "desconhecido"
+
+
+def consulta_usuario(email):
+    """Só as colunas que o login precisa. Contas excluídas (aguardando a purga) não entram."""
+    return select(
+        Usuario.id, Usuario.nome, Usuario.hash_senha, Usuario.twofa_ativo,
+        Usuario.totp_segredo, Usuario.totp_ultimo_passo,
+    ).where(Usuario.email == email, Usuario.excluido_em.is_(None))
+
+
+# ---------------- LOGIN -----------------
+def resposta_bloqueio(email, ip):
+    """
+    429 se o IP ou o e-mail estiverem bloqueados. Checado ANTES de ir ao
+    banco ou rodar o bcrypt: tentativa bloqueada não custa nada ao servidor.
+    """
+    if limite_ip.bloqueado(ip):
+        auditar(auditoria.LOGIN_BLOQUEADO, email=email, ip=ip, motivo="ip")
+        flash("Muitas tentativas de login a partir desta rede. Aguarde alguns minutos.", "erro")
+        return render_template("login.html"), 429
+    if limite_email.bloqueado(email):
+        auditar(auditoria.LOGIN_BLOQUEADO, email=email, ip=ip, motivo="email")
+        flash("Esta conta está temporariamente bloqueada por excesso de tentativas.", "erro")
+        return render_template("login.html"), 429
+    return None
+
+
+def resposta_ocupado():
+    """503 quando o executor de hash está saturado (FilaHashCheia)."""
+    flash("Muitas tentativas de login no momento. Tente novamente em alguns segundos.", "erro")
+    return render_template("login.html"), 503
+
+
+def resposta_senha_incorreta(usuario, email, ip):
+    """Conta +1 falha para o e-mail e para o IP e avisa quantas tentativas restam."""
+    limite_email.registrar_falha(email)
+    limite_ip.registrar_falha(ip)
+    tentativas_restantes = limite_email.restantes(email)
+    usuario_id = usuario.id if usuario else None
+    auditar(auditoria.LOGIN_FALHA, usuario_id, email, ip, restantes=tentativas_restantes)
+
+    if tentativas_restantes > 0:
+        flash(f"E-mail ou senha incorretos. {tentativas_restantes} tentativas restantes.", "erro")
+    else:
+        auditar(auditoria.LOGIN_BLOQUEADO, usuario_id, email, ip, motivo="limite")
+        flash("E-mail ou senha incorretos. A conta foi bloqueada.", "erro")
+    return render_template("login.html")
+
+
+def concluir_login(usuario, email, senha, ip):
+    """Senha certa: manda para o 2FA (aplicativo ou e-mail) ou entra direto."""
+    # Zera as falhas do e-mail (as do IP continuam: acertar a própria senha
+    # não libera testar outras contas)
+    limite_email.limpar(email)
+
+    # Hash feito com outro custo (política mudou): refaz em segundo plano
+    if precisa_rehash(usuario.hash_senha):
+        rehash_em_segundo_plano(usuario.id, senha, usuario.hash_senha)
+
+    # 2FA com aplicativo → só pede o código (nada é enviado nem guardado)
+    if usuario.twofa_ativo and usuario.totp_segredo:
+        session["email_temp"] = email
+        session["mfa_totp"] = True
+        return redirect(url_for("mfa"))
+
+    # 2FA por e-mail → gera e envia o código
+    if usuario.twofa_ativo:
+        codigo = f"{random.randint(100000, 999999):06d}"
+        # O armazenamento apaga o código sozinho quando ele expira
+        codigos_2fa.definir(email, {"codigo": codigo}, ttl=CODIGO_EXPIRA_MINUTOS * 60)
+        corpo = (
+            f"Olá, {usuario.nome}!\n\n"
+            f"Seu código de autenticação é: {codigo}\n"
+            f"Este código expira em {CODIGO_EXPIRA_MINUTOS} minutos."
+        )
+        enviar_email(email, "Código de autenticação 2FA", corpo)  # só enfileira
+        auditar(auditoria.MFA_ENVIADO, usuario.id, email, ip)
+        session["email_temp"] = email
+        session.pop("mfa_totp", None)  # sobra de um login anterior pelo aplicativo
+        return redirect(url_for("mfa"))
+
+    return entrar(usuario.id, email, ip, "senha")
+
+
+def entrar(usuario_id, email, ip, metodo):
+    """Abre a sessão do usuário (que expira por inatividade) e vai para o painel."""
+    auditar(auditoria.LOGIN_OK, usuario_id, email, ip, metodo=metodo)
+    session.pop("email_temp", None)
+    session.pop("mfa_totp", None)
+    session["usuario_id"] = usuario_id
+    session.permanent = True
+    return redirect(url_for("dashboard"))
+
+
+# ---------------- 2FA -----------------
+def tela_mfa():
+    """Página do código (do cache, se não houver flash)."""
+    return renderizar_pagina("2mfa.html", metodo="totp" if session.get("mfa_totp") else "email")
+
+
+def resposta_bloqueio_mfa(email_temp, ip):
+    """
+    O código do aplicativo não expira com o login, então as falhas contam
+    no limitador do e-mail (senão dava para tentar todos).
+    """
+    if not limite_email.bloqueado(email_temp):
+        return None
+    auditar(auditoria.LOGIN_BLOQUEADO, email=email_temp, ip=ip, motivo="mfa")
+    session.pop("email_temp", None)
+    session.pop("mfa_totp", None)
+    flash("Esta conta está temporariamente bloqueada por excesso de tentativas.", "erro")
+    return redirect(url_for("login"))
+
+
+def passo_totp(usuario, codigo):
+    """Passo do código do aplicativo, se ele estiver certo e ainda não foi usado."""
+    if usuario is None:
+        return None
+    return totp.verificar(usuario.totp_segredo, codigo, usuario.totp_ultimo_passo)
+
+
+def resposta_totp_incorreto(usuario, email_temp, ip):
+    limite_email.registrar_falha(email_temp)
+    auditar(auditoria.MFA_FALHA, usuario.id if usuario else None, email_temp, ip, metodo="totp")
+    flash("Código incorreto.", "erro")
+    return tela_mfa()
+
+
+def concluir_mfa_totp(usuario, email_temp, ip):
+    limite_email.limpar(email_temp)
+    return entrar(usuario.id, email_temp, ip, "totp")
+
+
+def conferir_codigo_email(email_temp, codigo, ip):
+    """Resposta de erro (código vencido ou errado) ou None se o código confere."""
+    # Códigos vencidos já não aparecem aqui (obter() retorna None)
+    entrada = codigos_2fa.obter(email_temp)
+    if not entrada:
+        flash("Código expirado. Faça login novamente.", "erro")
+        return redirect(url_for("login"))
+    if codigo != entrada["codigo"]:
+        auditar(auditoria.MFA_FALHA, email=email_temp, ip=ip, metodo="email")
+        flash("Código incorreto.", "erro")
+        return tela_mfa()
+    return None
+
+
+def concluir_mfa_email(usuario, email_temp, ip):
+    codigos_2fa.remover(email_temp)
+    if usuario is None:  # conta excluída entre o login e o código
+        flash("Código expirado. Faça login novamente.", "erro")
+        return redirect(url_for("login"))
+    return entrar(usuario.id, email_temp, ip, "email")
+
+
+# ---------------- CONFIRMAÇÃO (CONFIGURAÇÕES) -----------------
+def confirmar_identidade(db_session, usuario, confirmacao):
+    """
+    Confere a senha, ou o código atual do aplicativo (se houver), antes de
+    enfraquecer a conta (desligar o 2FA, remover o aplicativo): uma sessão
+    esquecida aberta não basta para isso. O código do aplicativo é consumido
+    como no /mfa e as falhas contam no limitador do e-mail. Não faz commit
+    do código consumido. Pode lançar FilaHashCheia.
+    """
+    if not confirmacao or limite_email.bloqueado(usuario.email):
+        return False
+    if usuario.totp_segredo:
+        passo = totp.verificar(usuario.totp_segredo, confirmacao, usuario.totp_ultimo_passo)
+        if passo and db_session.execute(totp.comando_uso(usuario.id, passo)).rowcount == 1:
+            return True
+    if verificar_senha(confirmacao, usuario.hash_senha):
+        return True
+    limite_email.registrar_falha(usuario.email)
+    return False
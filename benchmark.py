@@ -0,0 +1,400 @@
+"""
+Benchmark do fluxo de autenticação (/, /mfa, /cadastro, /dashboard...).
+
+Roda o app de verdade (main.py) contra um SQLite temporário, com o SMTP
+trocado por um servidor falso em memória, e dispara uma mistura de
+cenários em paralelo:
+- login: login sem 2FA + painel;
+- login_2fa: login com 2FA + envio do código em /mfa;
+- cadastro: criação de conta nova;
+- navegacao: usuário logado navegando entre painel, tickets e configurações.
+
+Para cada rota mostra req/s e latências p50/p95/p99, e quanto do tempo
+médio foi gasto em bcrypt, em consultas ao banco e em templates.
+
+Exemplos:
+    python benchmark.py --usuarios 200 --concorrencia 8 --duracao 20
+    python benchmark.py --saida base.json
+    python benchmark.py --saida novo.json --comparar base.json
+    SESSAO_BACKEND=sql python benchmark.py       # carga com sessões no banco
+    python benchmark.py --sessoes 2000           # só o custo de ler/gravar a sessão
+"""
+import argparse
+import tempfile
+import platform
+import threading
+import subprocess
+import random
+import time
+import json
+import os
+
+# O ambiente precisa estar pronto ANTES de importar o app
+_pasta = tempfile.mkdtemp(prefix="bench_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_pasta, 'bench.db')}"
+os.environ["DB_ECHO"] = "0"
+os.environ["ARMAZENAMENTO"] = "memoria"
+
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import event
+from flask import before_render_template, template_rendered, request
+import bcrypt
+
+import database
+import hashing
+import fila_email
+import sessoes
+import main
+import autenticacao
+
+SENHA = "Senha@123"
+MIX_PADRAO = "login=35,login_2fa=15,cadastro=10,navegacao=40"
+
+
+# ==========================
+# ⏱️ MEDIÇÃO POR COMPONENTE
+# ==========================
+# O test_client executa a requisição na própria thread, então uma variável
+# por thread basta para somar o tempo de cada componente da requisição atual.
+_atual = threading.local()
+
+
+def _somar(componente, segundos):
+    contagem = getattr(_atual, "componentes", None)
+    if contagem is not None:
+        contagem[componente] = contagem.get(componente, 0.0) + segundos
+
+
+def instrumentar():
+    """Liga os medidores de bcrypt, banco e templates."""
+    executar_original = hashing.executor_hash.executar
+
+    def executar_medindo(funcao, *args):
+        inicio = time.perf_counter()
+        try:
+            return executar_original(funcao, *args)
+        finally:
+            _somar("bcrypt", time.perf_counter() - inicio)
+
+    hashing.executor_hash.executar = executar_medindo
+
+    engine = database.obter_engine()
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _antes(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("bench_inicio", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _depois(conn, cursor, statement, parameters, context, executemany):
+        _somar("db", time.perf_counter() - conn.info["bench_inicio"].pop())
+
+    def _antes_template(sender, template, context, **extra):
+        _atual.inicio_template = time.perf_counter()
+
+    def _depois_template(sender, template, context, **extra):
+        _somar("template", time.perf_counter() - _atual.inicio_template)
+
+    before_render_template.connect(_antes_template, main.app, weak=False)
+    template_rendered.connect(_depois_template, main.app, weak=False)
+
+
+class SMTPFalso:
+    """Substitui o smtplib.SMTP: aceita tudo e só conta as mensagens."""
+    enviados = 0
+    _lock = threading.Lock()
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def starttls(self):
+        pass
+
+    def login(self, usuario, senha):
+        pass
+
+    def send_message(self, msg):
+        with SMTPFalso._lock:
+            SMTPFalso.enviados += 1
+
+    def quit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+# ==========================
+# 🌱 DADOS DE TESTE
+# ==========================
+def semear(qtd_usuarios, custo_bcrypt):
+    """Cria o banco e insere os usuários (metade com 2FA) de uma vez."""
+    database.criar_tabelas()
+    hash_senha = bcrypt.hashpw(SENHA.encode("utf-8"), bcrypt.gensalt(custo_bcrypt)).decode("utf-8")
+    linhas = [
+        {"nome": f"Usuário {i}", "email": f"usuario{i}@bench.local", "hash_senha": hash_senha, "twofa_ativo": i % 2}
+        for i in range(qtd_usuarios)
+    ]
+    with database.obter_engine().begin() as conexao:
+        conexao.execute(database.Usuario.__table__.insert(), linhas)
+    return [linha["email"] for linha in linhas if not linha["twofa_ativo"]], [linha["email"] for linha in linhas if linha["twofa_ativo"]]
+
+
+# ==========================
+# 🎬 CENÁRIOS
+# ==========================
+class Executor:
+    """Executa cenários e guarda uma amostra por requisição."""
+
+    def __init__(self, sem_2fa, com_2fa):
+        self.sem_2fa = sem_2fa
+        self.com_2fa = com_2fa
+        self.amostras = []  # (rota, segundos, status, componentes)
+        self._lock = threading.Lock()
+        self._cadastros = 0
+
+    def _req(self, cliente, rota, metodo, caminho, **kwargs):
+        _atual.componentes = {}
+        inicio = time.perf_counter()
+        resposta = cliente.open(caminho, method=metodo, **kwargs)
+        duracao = time.perf_counter() - inicio
+        with self._lock:
+            self.amostras.append((rota, duracao, resposta.status_code, _atual.componentes))
+        _atual.componentes = None
+        return resposta
+
+    def login(self, cliente):
+        email = random.choice(self.sem_2fa)
+        self._req(cliente, "POST /", "POST", "/", data={"email": email, "senha": SENHA})
+        self._req(cliente, "GET /dashboard", "GET", "/dashboard")
+        self._req(cliente, "GET /logout", "GET", "/logout")
+
+    def login_2fa(self, cliente):
+        email = random.choice(self.com_2fa)
+        self._req(cliente, "GET /", "GET", "/")
+        self._req(cliente, "POST / (2FA)", "POST", "/", data={"email": email, "senha": SENHA})
+        entrada = autenticacao.codigos_2fa.obter(email) or {"codigo": "000000"}
+        self._req(cliente, "POST /mfa", "POST", "/mfa", data={"codigo": entrada["codigo"]})
+        self._req(cliente, "GET /logout", "GET", "/logout")
+
+    def cadastro(self, cliente):
+        with self._lock:
+            self._cadastros += 1
+            n = self._cadastros
+        self._req(cliente, "GET /cadastro", "GET", "/cadastro")
+        self._req(cliente, "POST /cadastro", "POST", "/cadastro", data={
+            "nome": f"Novo {n}", "email": f"novo{n}_{os.getpid()}@bench.local",
+            "senha": SENHA, "confirmacao": SENHA, "termos": "on",
+        })
+
+    def navegacao(self, cliente):
+        email = random.choice(self.sem_2fa)
+        cliente.post("/", data={"email": email, "senha": SENHA})  # preparo (não medido)
+        for caminho in ("/dashboard", "/meus_tickets", "/configuracoes", "/dashboard"):
+            self._req(cliente, f"GET {caminho}", "GET", caminho)
+        cliente.get("/logout")
+
+
+def _ler_mix(texto):
+    pesos = {}
+    for parte in texto.split(","):
+        nome, peso = parte.split("=")
+        pesos[nome.strip()] = float(peso)
+    return pesos
+
+
+def rodar(args):
+    sem_2fa, com_2fa = semear(args.usuarios, args.custo_bcrypt)
+    fila_email.smtplib.SMTP = SMTPFalso
+    instrumentar()
+
+    executor = Executor(sem_2fa, com_2fa)
+    mix = _ler_mix(args.mix)
+    cenarios = [getattr(executor, nome) for nome in mix]
+    pesos = list(mix.values())
+
+    # Aquecimento: cada cenário uma vez (carrega templates, abre conexões)
+    cliente = main.app.test_client()
+    for cenario in cenarios:
+        cenario(cliente)
+    executor.amostras.clear()
+
+    fim = time.monotonic() + args.duracao
+
+    def trabalhador():
+        cliente = main.app.test_client()
+        while time.monotonic() < fim:
+            random.choices(cenarios, pesos)[0](cliente)
+
+    inicio = time.monotonic()
+    with ThreadPoolExecutor(max_workers=args.concorrencia) as pool:
+        for futuro in [pool.submit(trabalhador) for _ in range(args.concorrencia)]:
+            futuro.result()
+    duracao = time.monotonic() - inicio
+    fila_email.fila_email.esvaziar(10)
+    return executor.amostras, duracao
+
+
+# ==========================
+# 🍪 CUSTO DA SESSÃO POR BACKEND
+# ==========================
+def medir_sessoes(repeticoes):
+    """
+    Mede, para cada backend de sessão, o tempo de:
+    - gravar: sessão nova com usuário logado (o que o login faz);
+    - ler: abrir a sessão a partir do cookie;
+    - renovar: gravar de novo sem alterar nada (qualquer página interna).
+    """
+    database.criar_tabelas()
+    app = main.app
+    resultado = {}
+    for backend in ("cookie", "sql"):
+        interface = sessoes.criar_interface_sessao(backend)
+        tempos = {"gravar": [], "ler": [], "renovar": []}
+        tamanho_cookie = 0
+        for i in range(repeticoes):
+            with app.test_request_context("/"):
+                sessao = interface.open_session(app, request)
+                sessao["usuario_id"] = i
+                sessao.permanent = True
+                resposta = app.response_class()
+                inicio = time.perf_counter()
+                interface.save_session(app, sessao, resposta)
+                tempos["gravar"].append(time.perf_counter() - inicio)
+            cookie = resposta.headers["Set-Cookie"].split(";", 1)[0]
+            tamanho_cookie = max(tamanho_cookie, len(cookie))
+
+            with app.test_request_context("/", headers={"Cookie": cookie}):
+                inicio = time.perf_counter()
+                sessao = interface.open_session(app, request)
+                tempos["ler"].append(time.perf_counter() - inicio)
+                inicio = time.perf_counter()
+                interface.save_session(app, sessao, app.response_class())
+                tempos["renovar"].append(time.perf_counter() - inicio)
+
+        resultado[backend] = {"cookie_bytes": tamanho_cookie}
+        for operacao, valores in tempos.items():
+            valores.sort()
+            resultado[backend][f"{operacao}_p50_us"] = round(_percentil(valores, 0.50) * 1e6, 1)
+            resultado[backend][f"{operacao}_p95_us"] = round(_percentil(valores, 0.95) * 1e6, 1)
+    return resultado
+
+
+# ==========================
+# 📊 RELATÓRIO
+# ==========================
+def _percentil(ordenadas, p):
+    if not ordenadas:
+        return 0.0
+    return ordenadas[min(len(ordenadas) - 1, int(round(p * (len(ordenadas) - 1))))]
+
+
+def resumir(amostras, duracao):
+    por_rota = {}
+    for rota, segundos, status, componentes in amostras:
+        por_rota.setdefault(rota, []).append((segundos, status, componentes))
+
+    resultado = {}
+    for rota, itens in sorted(por_rota.items()):
+        tempos = sorted(i[0] for i in itens)
+        n = len(itens)
+        componentes = {}
+        for _, _, comp in itens:
+            for nome, valor in comp.items():
+                componentes[nome] = componentes.get(nome, 0.0) + valor
+        resultado[rota] = {
+            "requisicoes": n,
+            "req_s": round(n / duracao, 2),
+            "erros": sum(1 for i in itens if i[1] >= 500),
+            "p50_ms": round(_percentil(tempos, 0.50) * 1000, 2),
+            "p95_ms": round(_percentil(tempos, 0.95) * 1000, 2),
+            "p99_ms": round(_percentil(tempos, 0.99) * 1000, 2),
+            "media_ms": round(sum(tempos) / n * 1000, 2),
+            # tempo médio por requisição gasto em cada componente
+            "bcrypt_ms": round(componentes.get("bcrypt", 0.0) / n * 1000, 2),
+            "db_ms": round(componentes.get("db", 0.0) / n * 1000, 2),
+            "template_ms": round(componentes.get("template", 0.0) / n * 1000, 2),
+        }
+    return resultado
+
+
+def _commit_atual():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def imprimir(rotas, base=None):
+    colunas = ["req_s", "p50_ms", "p95_ms", "p99_ms", "bcrypt_ms", "db_ms", "template_ms"]
+    print(f"{'rota':<22}{'n':>7}" + "".join(f"{c:>13}" for c in colunas))
+    for rota, dados in rotas.items():
+        linha = f"{rota:<22}{dados['requisicoes']:>7}"
+        for c in colunas:
+            valor = f"{dados[c]:.2f}"
+            if base and rota in base and base[rota].get(c):
+                delta = (dados[c] - base[rota][c]) / base[rota][c] * 100
+                valor += f" ({delta:+.0f}%)"
+            linha += f"{valor:>13}" if not base else f" {valor:>18}"
+        print(linha)
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Benchmark do fluxo de autenticação.")
+    parser.add_argument("--usuarios", type=int, default=200, help="usuários semeados no banco")
+    parser.add_argument("--concorrencia", type=int, default=8, help="clientes simultâneos")
+    parser.add_argument("--duracao", type=float, default=15, help="segundos de carga")
+    parser.add_argument("--mix", default=MIX_PADRAO, help=f"pesos dos cenários (padrão: {MIX_PADRAO})")
+    parser.add_argument("--custo-bcrypt", type=int, default=12, help="custo dos hashes semeados")
+    parser.add_argument("--seed", type=int, default=42, help="semente do gerador aleatório")
+    parser.add_argument("--saida", help="grava o resultado em JSON")
+    parser.add_argument("--comparar", help="JSON de uma rodada anterior para comparar")
+    parser.add_argument("--sessoes", type=int, metavar="N",
+                        help="só mede ler/gravar a sessão em cada backend (N repetições)")
+    args = parser.parse_args()
+
+    if args.sessoes:
+        resultado = medir_sessoes(args.sessoes)
+        colunas = list(next(iter(resultado.values())))
+        print(f"{'backend':<10}" + "".join(f"{c:>16}" for c in colunas))
+        for backend, dados in resultado.items():
+            print(f"{backend:<10}" + "".join(f"{dados[c]:>16}" for c in colunas))
+        if args.saida:
+            with open(args.saida, "w", encoding="utf-8") as arquivo:
+                json.dump({"commit": _commit_atual(), "sessoes": resultado}, arquivo, indent=2)
+        return
+
+    random.seed(args.seed)
+    # Mesmo custo dos hashes semeados: o login não dispara rehash no meio da medição
+    hashing.definir_custo(args.custo_bcrypt)
+    amostras, duracao = rodar(args)
+    rotas = resumir(amostras, duracao)
+
+    resultado = {
+        "commit": _commit_atual(),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "parametros": {k: v for k, v in vars(args).items() if k not in ("saida", "comparar")},
+        "duracao_s": round(duracao, 2),
+        "total_req_s": round(len(amostras) / duracao, 2),
+        "emails_enviados": SMTPFalso.enviados,
+        "sessao_backend": sessoes.SESSAO_BACKEND,
+        "rotas": rotas,
+    }
+
+    base = None
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as arquivo:
+            base = json.load(arquivo)["rotas"]
+    imprimir(rotas, base)
+    print(f"\nTotal: {resultado['total_req_s']} req/s em {resultado['duracao_s']} s "
+          f"({args.concorrencia} clientes, commit {resultado['commit']})")
+
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as arquivo:
+            json.dump(resultado, arquivo, indent=2, ensure_ascii=False)
+        print(f"Resultado salvo em {args.saida}")
+
+
+if __name__ == "__main__":
+    main_cli()
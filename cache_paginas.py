@@ -0,0 +1,204 @@
+"""
+Cache de páginas inteiras para visitantes (GET de /, /cadastro e /mfa).
+
+Essas páginas só mudam por causa das mensagens de flash, mas eram
+renderizadas a cada acesso. Em pico de acessos à tela de login, é CPU
+gasto para gerar sempre o mesmo HTML. renderizar_pagina() substitui o
+render_template() nessas rotas:
+- chave: rota + template + variáveis passadas + versão dos templates
+  (hash dos arquivos de templates/, do manifesto do CSS e de VERSAO_APP),
+  então um deploy novo nunca serve página velha;
+- ignora o cache se não for GET, se houver flash esperando para aparecer
+  ou com o recarregamento de templates ligado (debug);
+- resposta com ETag forte (hash do HTML): se o navegador mandar
+  If-None-Match igual, volta 304 sem corpo;
+- LRU em memória (PAGINAS_MAX) e, se PAGINAS_CACHE_PASTA estiver definida,
+  cópia em disco: um worker novo aproveita o que os outros já geraram.
+  No disco, cada versão dos templates tem a sua subpasta; na primeira
+  página de cada processo, as subpastas de outras versões são apagadas
+  (senão cada deploy deixaria as páginas antigas para sempre).
+"""
+from collections import OrderedDict
+from flask import current_app, request, session, render_template, make_response
+from cache_templates import VERSAO_APP
+from dotenv import load_dotenv
+import threading
+import hashlib
+import shutil
+import os
+
+load_dotenv()
+
+PAGINAS_MAX = int(os.getenv("PAGINAS_MAX", 256))
+PAGINAS_CACHE_PASTA = os.getenv("PAGINAS_CACHE_PASTA", "")  # vazio = só memória
+
+
+class CachePaginas:
+    """LRU de páginas renderizadas (HTML + ETag), com cópia opcional em disco."""
+
+    def __init__(self, tamanho_max=PAGINAS_MAX, pasta=PAGINAS_CACHE_PASTA):
+        self.tamanho_max = tamanho_max
+        self.pasta = pasta or None
+        self._dados = OrderedDict()  # chave -> (html, etag)
+        self._lock = threading.Lock()
+        self._acertos = 0
+        self._acertos_disco = 0
+        self._falhas = 0
+        self._nao_modificados = 0
+        self._versao_disco = None  # versão cuja subpasta já foi preparada neste processo
+
+    def obter(self, chave, renderizar, versao=""):
+        """
+        Retorna (html, etag) do cache, do disco ou de `renderizar()`.
+        `versao` (a dos templates, já contida na chave) escolhe a subpasta do disco.
+        """
+        with self._lock:
+            entrada = self._dados.get(chave)
+            if entrada is not None:
+                self._dados.move_to_end(chave)
+                self._acertos += 1
+                return entrada
+
+        html = self._ler_disco(chave, versao)
+        if html is not None:
+            with self._lock:
+                self._acertos_disco += 1
+        else:
+            html = renderizar()
+            self._gravar_disco(chave, versao, html)
+            with self._lock:
+                self._falhas += 1
+
+        entrada = (html, hashlib.sha256(html.encode("utf-8")).hexdigest()[:32])
+        with self._lock:
+            self._dados[chave] = entrada
+            self._dados.move_to_end(chave)
+            while len(self._dados) > self.tamanho_max:
+                self._dados.popitem(last=False)
+        return entrada
+
+    def _caminho(self, chave, versao):
+        nome = hashlib.sha256(repr(chave).encode("utf-8")).hexdigest() + ".html"
+        return os.path.join(self.pasta, versao or "_", nome)
+
+    def _preparar_disco(self, versao):
+        """Uma vez por processo e versão: apaga da pasta as páginas de outras versões."""
+        versao = versao or "_"
+        if self._versao_disco == versao:
+            return
+        with self._lock:
+            if self._versao_disco == versao:
+                return
+            self._versao_disco = versao
+        try:
+            for nome in os.listdir(self.pasta):
+                if nome == versao:
+                    continue
+                caminho = os.path.join(self.pasta, nome)
+                if os.path.isdir(caminho):
+                    shutil.rmtree(caminho, ignore_errors=True)
+                else:
+                    os.remove(caminho)  # páginas soltas do formato antigo (sem subpasta)
+        except OSError:
+            pass  # a pasta ainda não existe ou outro worker já limpou
+
+    def _ler_disco(self, chave, versao):
+        if not self.pasta:
+            return None
+        self._preparar_disco(versao)
+        try:
+            with open(self._caminho(chave, versao), encoding="utf-8") as arquivo:
+                return arquivo.read()
+        except OSError:
+            return None
+
+    def _gravar_disco(self, chave, versao, html):
+        if not self.pasta:
+            return
+        caminho = self._caminho(chave, versao)
+        # Temporário + rename: outro worker nunca lê a página pela metade
+        temporario = f"{caminho}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(caminho), exist_ok=True)
+            with open(temporario, "w", encoding="utf-8") as arquivo:
+                arquivo.write(html)
+            os.replace(temporario, caminho)
+        except OSError:
+            pass  # disco é só um extra; a página continua em memória
+
+    def registrar_304(self):
+        with self._lock:
+            self._nao_modificados += 1
+
+    def limpar(self):
+        with self._lock:
+            self._dados.clear()
+
+    def metricas(self):
+        with self._lock:
+            total = self._acertos + self._acertos_disco + self._falhas
+            return {
+                "tamanho": len(self._dados),
+                "tamanho_max": self.tamanho_max,
+                "acertos": self._acertos,
+                "acertos_disco": self._acertos_disco,
+                "falhas": self._falhas,
+                "nao_modificados": self._nao_modificados,
+                "taxa_acerto": round((self._acertos + self._acertos_disco) / total, 4) if total else 0.0,
+            }
+
+
+# --- Instância única usada pelas rotas ---
+cache_paginas = CachePaginas()
+
+_versao = None
+_versao_lock = threading.Lock()
+
+
+def versao_templates():
+    """
+    Hash dos templates, do manifesto do CSS (asset_url muda o HTML) e da
+    versão do app. Calculado uma vez por processo: sem o recarregamento
+    ligado, o Jinja também não relê os templates.
+    """
+    global _versao
+    if _versao is None:
+        with _versao_lock:
+            if _versao is None:
+                resumo = hashlib.sha256(VERSAO_APP.encode("utf-8"))
+                ambiente = current_app.jinja_env
+                for nome in sorted(ambiente.list_templates()):
+                    resumo.update(nome.encode("utf-8"))
+                    resumo.update(ambiente.loader.get_source(ambiente, nome)[0].encode("utf-8"))
+                manifesto = os.path.join(current_app.static_folder, "dist", "manifest.json")
+                if os.path.exists(manifesto):
+                    with open(manifesto, "rb") as arquivo:
+                        resumo.update(arquivo.read())
+                _versao = resumo.hexdigest()[:16]
+    return _versao
+
+
+def renderizar_pagina(nome_template, **contexto):
+    """
+    render_template() com cache para páginas que não dependem do usuário.
+    Use só em páginas de visitante; os valores de `contexto` entram na chave.
+    """
+    if (
+        request.method != "GET"
+        or session.get("_flashes")
+        or current_app.jinja_env.auto_reload
+    ):
+        return render_template(nome_template, **contexto)
+
+    versao = versao_templates()
+    chave = (request.endpoint, request.script_root, nome_template, tuple(sorted(contexto.items())), versao)
+    html, etag = cache_paginas.obter(chave, lambda: render_template(nome_template, **contexto), versao)
+
+    resposta = make_response(html)
+    resposta.set_etag(etag)  # forte: o HTML é idêntico byte a byte
+    resposta.cache_control.private = True
+    resposta.cache_control.no_cache = True  # o navegador guarda, mas revalida com o ETag
+    resposta = resposta.make_conditional(request)
+    if resposta.status_code == 304:
+        cache_paginas.registrar_304()
+    return resposta
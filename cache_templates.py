@@ -0,0 +1,108 @@
+"""
+Cache dos templates Jinja.
+
+Duas camadas:
+- Bytecode em disco (TEMPLATES_CACHE_PASTA): o Jinja guarda cada template já
+  compilado e, no boot de um worker, carrega o bytecode em vez de analisar
+  o HTML de novo. `flask --app main compilar-templates` gera tudo antes de
+  subir o servidor (ex.: no deploy).
+- Fragmentos: a barra lateral das páginas internas (avatar, nome, menu) é
+  a mesma em todo clique. sidebar("pagina") renderiza _sidebar.html uma vez
+  por (usuário, nome, página ativa, versão do app) e reaproveita o HTML.
+  O nome faz parte da chave, então renomear invalida sozinho.
+
+Com o recarregamento de templates ligado (debug), o cache de fragmentos é
+ignorado para as edições aparecerem na hora.
+"""
+from collections import OrderedDict
+from jinja2 import FileSystemBytecodeCache, pass_context
+from markupsafe import Markup
+from dotenv import load_dotenv
+import threading
+import os
+
+load_dotenv()
+
+TEMPLATES_CACHE_PASTA = os.getenv("TEMPLATES_CACHE_PASTA", ".cache_templates")
+FRAGMENTOS_MAX = int(os.getenv("FRAGMENTOS_MAX", 5000))
+VERSAO_APP = "1.0"  # exibida no rodapé e parte da chave dos fragmentos
+
+
+class CacheFragmentos:
+    """LRU de pedaços de HTML já renderizados, seguro entre threads."""
+
+    def __init__(self, tamanho_max=FRAGMENTOS_MAX):
+        self.tamanho_max = tamanho_max
+        self._dados = OrderedDict()  # chave -> Markup
+        self._lock = threading.Lock()
+        self._acertos = 0
+        self._falhas = 0
+
+    def obter(self, chave, renderizar):
+        """Retorna o HTML guardado ou chama `renderizar()` e guarda."""
+        with self._lock:
+            html = self._dados.get(chave)
+            if html is not None:
+                self._dados.move_to_end(chave)
+                self._acertos += 1
+                return html
+            self._falhas += 1
+
+        html = Markup(renderizar())
+        with self._lock:
+            self._dados[chave] = html
+            self._dados.move_to_end(chave)
+            while len(self._dados) > self.tamanho_max:
+                self._dados.popitem(last=False)
+        return html
+
+    def limpar(self):
+        with self._lock:
+            self._dados.clear()
+
+    def metricas(self):
+        with self._lock:
+            total = self._acertos + self._falhas
+            return {
+                "tamanho": len(self._dados),
+                "acertos": self._acertos,
+                "falhas": self._falhas,
+                "taxa_acerto": round(self._acertos / total, 4) if total else 0.0,
+            }
+
+
+# --- Instância única usada pelos templates ---
+cache_fragmentos = CacheFragmentos()
+
+
+@pass_context
+def sidebar(contexto, ativo):
+    """Barra lateral das páginas internas; `ativo` é o endpoint da página."""
+    usuario = contexto["usuario"]
+    ambiente = contexto.environment
+
+    def renderizar():
+        return ambiente.get_template("_sidebar.html").render(usuario=usuario, ativo=ativo, versao=VERSAO_APP)
+
+    if ambiente.auto_reload:
+        return Markup(renderizar())
+    return cache_fragmentos.obter((usuario.id, usuario.nome, ativo, VERSAO_APP), renderizar)
+
+
+def init_templates(app):
+    """
+    Liga o cache de bytecode e a função sidebar() no app.
+    Precisa rodar antes do primeiro uso de app.jinja_env.
+    """
+    pasta = os.path.join(app.root_path, TEMPLATES_CACHE_PASTA)
+    os.makedirs(pasta, exist_ok=True)
+    app.jinja_options = {**app.jinja_options, "bytecode_cache": FileSystemBytecodeCache(pasta)}
+    app.add_template_global(sidebar)
+
+    @app.cli.command("compilar-templates")
+    def comando_compilar_templates():
+        """Compila todos os templates e grava o bytecode em disco."""
+        nomes = app.jinja_env.list_templates(extensions=["html"])
+        for nome in nomes:
+            app.jinja_env.get_template(nome)
+        print(f"✅ {len(nomes)} templates compilados em {pasta}.")
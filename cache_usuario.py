@@ -0,0 +1,134 @@
+"""
+Cache do perfil do usuário logado.
+
+As páginas internas (painel, tickets, configurações) só precisam do nome e
+do status do 2FA, mas buscavam a linha inteira no banco a cada clique.
+Aqui guardamos um "perfil" leve por usuário:
+- leitura com preenchimento automático (read-through): se não está no
+  cache, busca no banco e guarda;
+- validade limitada (CACHE_USUARIO_TTL) e tamanho máximo com descarte do
+  menos usado (LRU, CACHE_USUARIO_MAX);
+- invalidação explícita quando o usuário muda (2FA, aplicativo) ou é excluído.
+  Cada invalidação sobe a "geração" das buscas em andamento do usuário: uma
+  busca que começou antes dela não guarda o perfil antigo por cima. A
+  geração só existe enquanto há busca em andamento (não cresce sem limite).
+
+O cache é de cada processo; em vários workers, o TTL limita por quanto
+tempo um processo pode mostrar um dado antigo.
+"""
+from collections import OrderedDict, namedtuple
+from database import Usuario, session as db_session
+from dotenv import load_dotenv
+import threading
+import time
+import os
+
+load_dotenv()
+
+CACHE_USUARIO_TTL = float(os.getenv("CACHE_USUARIO_TTL", 60))  # segundos
+CACHE_USUARIO_MAX = int(os.getenv("CACHE_USUARIO_MAX", 10000))
+
+# Só o que os templates usam (usuario.nome, usuario.twofa_ativo...)
+PerfilUsuario = namedtuple("PerfilUsuario", ["id", "nome", "email", "twofa_ativo", "totp_ativo"])
+
+# Colunas do perfil, na ordem de PerfilUsuario (o segredo TOTP não sai do banco)
+COLUNAS_PERFIL = (
+    Usuario.id, Usuario.nome, Usuario.email, Usuario.twofa_ativo,
+    Usuario.totp_segredo.isnot(None).label("totp_ativo"),
+)
+
+
+class CacheUsuarios:
+    """LRU com TTL, seguro entre threads."""
+
+    def __init__(self, tamanho_max=CACHE_USUARIO_MAX, ttl=CACHE_USUARIO_TTL):
+        self.tamanho_max = tamanho_max
+        self.ttl = ttl
+        self._dados = OrderedDict()  # usuario_id -> (perfil, expira_em)
+        self._buscas = {}            # usuario_id -> [buscas em andamento, invalidações durante elas]
+        self._lock = threading.Lock()
+        self._acertos = 0
+        self._falhas = 0
+        self._descartes = 0
+
+    def obter(self, usuario_id, carregar):
+        """Retorna o perfil do cache ou chama `carregar(usuario_id)` e guarda."""
+        agora = time.monotonic()
+        with self._lock:
+            entrada = self._dados.get(usuario_id)
+            if entrada is not None and entrada[1] > agora:
+                self._dados.move_to_end(usuario_id)
+                self._acertos += 1
+                return entrada[0]
+            self._falhas += 1
+            busca = self._buscas.setdefault(usuario_id, [0, 0])
+            busca[0] += 1
+            geracao = busca[1]
+
+        # Busca fora do lock para não travar as outras threads
+        try:
+            perfil = carregar(usuario_id)
+        except BaseException:
+            with self._lock:
+                self._encerrar_busca(usuario_id, busca)
+            raise
+
+        with self._lock:
+            self._encerrar_busca(usuario_id, busca)
+            if perfil is None:
+                return None
+            if busca[1] != geracao:
+                return perfil  # invalidado durante a busca: pode estar velho, não guarda
+            self._dados[usuario_id] = (perfil, agora + self.ttl)
+            self._dados.move_to_end(usuario_id)
+            while len(self._dados) > self.tamanho_max:
+                self._dados.popitem(last=False)
+                self._descartes += 1
+        return perfil
+
+    def invalidar(self, usuario_id):
+        with self._lock:
+            self._dados.pop(usuario_id, None)
+            if usuario_id in self._buscas:
+                self._buscas[usuario_id][1] += 1
+
+    def _encerrar_busca(self, usuario_id, busca):
+        """Chamado com o lock: a última busca do usuário apaga a geração dele."""
+        busca[0] -= 1
+        if not busca[0]:
+            del self._buscas[usuario_id]
+
+    def metricas(self):
+        with self._lock:
+            total = self._acertos + self._falhas
+            return {
+                "tamanho": len(self._dados),
+                "tamanho_max": self.tamanho_max,
+                "acertos": self._acertos,
+                "falhas": self._falhas,
+                "descartes": self._descartes,
+                "taxa_acerto": round(self._acertos / total, 4) if total else 0.0,
+            }
+
+
+# --- Instância única usada pelas rotas ---
+cache_usuarios = CacheUsuarios()
+
+
+def _buscar_perfil(usuario_id):
+    linha = (
+        db_session.query(*COLUNAS_PERFIL)
+        .filter(Usuario.id == usuario_id, Usuario.excluido_em.is_(None))
+        .first()
+    )
+    return PerfilUsuario(*linha) if linha else None
+
+
+def carregar_perfil(usuario_id):
+    """Perfil do usuário (do cache, ou do banco na primeira vez)."""
+    return cache_usuarios.obter(usuario_id, _buscar_perfil)
+
+
+def invalidar_perfil(usuario_id):
+    """Tira o usuário do cache (chame depois de alterar ou excluir)."""
+    cache_usuarios.invalidar(usuario_id)
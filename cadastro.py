@@ -1,6 +1,6 @@
-import re
-import bcrypt
 from database import session, Usuario
+from hashing import gerar_hash
+from validacao import erros_email, erros_senha
 
 def cadastrar():
     """
@@ -15,22 +15,17 @@ def cadastrar():
         senha = input("Digite sua senha: ")
         confirmacao_senha = input("Confirme sua senha: ")
 
-        # --- Validação de e-mail ---
-        padrao_email = r'^[\w\.-]+@[\w\.-]+\.\w+$'
-        if not re.fullmatch(padrao_email, email):
-            print("❌ E-mail inválido! Exemplo: usuario@dominio.com")
-            continue
-
-        # --- Validação de senha ---
-        padrao_senha = r'^(?=.*[a-z])(?=.*[A-Z])(?=.*\d)(?=.*[@#$%&*!?]).{8,}$'
-        if not re.fullmatch(padrao_senha, senha):
+        # --- Validação de e-mail e senha (mostra todas as regras que falharam) ---
+        problemas_email = erros_email(email)
+        problemas_senha = erros_senha(senha)
+        for mensagem in problemas_email:
+            print("❌", mensagem)
+        if problemas_senha:
             print("❌ Senha inválida!")
-            print("A senha deve conter:")
-            print("- Pelo menos 8 caracteres")
-            print("- Uma letra maiúscula")
-            print("- Uma letra minúscula")
-            print("- Um número")
-            print("- Um caractere especial (@#$%&*!?)")
+            print("Requisitos não atendidos:")
+            for regra in problemas_senha:
+                print("-", regra)
+        if problemas_email or problemas_senha:
             continue
 
         # --- Confirmação de senha ---
@@ -45,14 +40,15 @@ def cadastrar():
             continue
 
         # --- Criação do hash da senha ---
-        # O bcrypt gera um hash seguro e aleatório (com salt automático)
-        hash_senha = bcrypt.hashpw(senha.encode("utf-8"), bcrypt.gensalt())
+        # O bcrypt gera um hash seguro e aleatório (com salt automático),
+        # com o custo da política atual (veja hashing.py)
+        hash_senha = gerar_hash(senha)
 
         # --- Criação do objeto de usuário ---
         novo_usuario = Usuario(
             nome=nome.strip(),
             email=email.lower().strip(),
-            hash_senha=hash_senha.decode("utf-8")  # Salva o hash como texto no banco
+            hash_senha=hash_senha  # Salva o hash como texto no banco
         )
 
         # --- Inserção no banco de dados ---
@@ -0,0 +1,251 @@
+"""
+Fila de envio de e-mails em segundo plano.
+
+Antes, cada login com 2FA abria uma conexão SMTP, fazia STARTTLS, login,
+enviava uma mensagem e fechava tudo dentro da requisição. Agora a rota só
+coloca a mensagem na fila e segue; workers em segundo plano fazem o envio:
+- cada worker mantém uma conexão SMTP persistente e reaproveitada;
+- mensagens são enviadas em lotes pela mesma conexão;
+- falhas são retentadas com backoff exponencial;
+- depois de SMTP_TENTATIVAS falhas a mensagem vai para a lista de "mortos".
+
+Para testar localmente sem TLS/login (ex.: aiosmtpd em localhost:8025),
+use SMTP_STARTTLS=0 e deixe SMTP_USER/SMTP_PASS vazios.
+"""
+from email.message import EmailMessage
+from collections import deque
+from dotenv import load_dotenv
+from instrumentacao import span, registrar_span
+import threading
+import smtplib
+import random
+import heapq
+import queue
+import time
+import os
+
+load_dotenv()
+
+# ==========================
+# 📬 CONFIGURAÇÃO DO E-MAIL
+# ==========================
+SMTP_HOST = os.getenv("SMTP_HOST")
+SMTP_PORT = int(os.getenv("SMTP_PORT", 587))
+SMTP_USER = os.getenv("SMTP_USER")
+SMTP_PASS = os.getenv("SMTP_PASS")
+SMTP_REMETENTE = os.getenv("SMTP_REMETENTE") or SMTP_USER
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "1").lower() in ("1", "true", "sim")
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", 10))
+
+SMTP_CONEXOES = int(os.getenv("SMTP_CONEXOES", 2))        # workers/conexões persistentes
+SMTP_LOTE = int(os.getenv("SMTP_LOTE", 20))               # mensagens por lote
+SMTP_TENTATIVAS = int(os.getenv("SMTP_TENTATIVAS", 5))    # antes de ir para os mortos
+SMTP_BACKOFF = float(os.getenv("SMTP_BACKOFF", 1.0))      # segundos (dobra a cada falha)
+SMTP_OCIOSO_MAX = float(os.getenv("SMTP_OCIOSO_MAX", 60))  # fecha conexões paradas
+
+
+class FilaEmail:
+    """
+    Fila de e-mails com pool de conexões SMTP persistentes.
+    - enfileirar() é O(1) e nunca faz I/O de rede.
+    - Os workers são criados na primeira mensagem de cada processo.
+    """
+
+    def __init__(self, host=SMTP_HOST, port=SMTP_PORT, usuario=SMTP_USER, senha=SMTP_PASS,
+                 remetente=SMTP_REMETENTE, starttls=SMTP_STARTTLS, conexoes=SMTP_CONEXOES,
+                 lote=SMTP_LOTE, tentativas=SMTP_TENTATIVAS, backoff=SMTP_BACKOFF):
+        self.host = host
+        self.port = port
+        self.usuario = usuario
+        self.senha = senha
+        self.remetente = remetente
+        self.starttls = starttls
+        self.conexoes = conexoes
+        self.lote = lote
+        self.tentativas = tentativas
+        self.backoff = backoff
+
+        self._fila = queue.Queue()
+        self._adiados = []  # heap de (pronto_em, seq, item) aguardando retentativa
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._pid = None
+        self._workers = []
+        self._em_envio = 0
+        self._pendentes = 0  # ainda não enviadas nem descartadas
+
+        # Mensagens que esgotaram as tentativas (dead-letter)
+        self.mortos = deque(maxlen=1000)
+
+        # --- Métricas ---
+        self._enfileirados = 0
+        self._enviados = 0
+        self._retentativas = 0
+        self._conexoes_abertas = 0
+
+    # ---------------- API PÚBLICA -----------------
+    def enfileirar(self, destinatario, assunto, corpo):
+        """Coloca a mensagem na fila de envio e retorna imediatamente."""
+        with span("smtp_fila"):
+            msg = EmailMessage()
+            msg["From"] = self.remetente
+            msg["To"] = destinatario
+            msg["Subject"] = assunto
+            msg.set_content(corpo)
+
+            self._iniciar()
+            with self._lock:
+                self._enfileirados += 1
+                self._pendentes += 1
+            self._fila.put({"msg": msg, "tentativa": 0, "erro": None})
+
+    def esvaziar(self, timeout=30):
+        """Espera até não haver mensagens pendentes. Retorna True se esvaziou."""
+        limite = time.monotonic() + timeout
+        while time.monotonic() < limite:
+            with self._lock:
+                vazia = self._pendentes == 0
+            if vazia:
+                return True
+            time.sleep(0.05)
+        return False
+
+    def metricas(self):
+        """Fotografia das métricas da fila."""
+        with self._lock:
+            return {
+                "na_fila": self._fila.qsize(),
+                "aguardando_retentativa": len(self._adiados),
+                "em_envio": self._em_envio,
+                "enfileirados": self._enfileirados,
+                "enviados": self._enviados,
+                "retentativas": self._retentativas,
+                "mortos": len(self.mortos),
+                "conexoes_abertas": self._conexoes_abertas,
+            }
+
+    # ---------------- WORKERS -----------------
+    def _iniciar(self):
+        """Cria os workers do processo atual (de novo após um fork)."""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._workers = []
+            for i in range(self.conexoes):
+                t = threading.Thread(target=self._loop_worker, name=f"smtp-{i}", daemon=True)
+                t.start()
+                self._workers.append(t)
+            self._pid = os.getpid()
+
+    def _proximo(self, espera):
+        """Pega o próximo item: primeiro retentativas vencidas, depois a fila."""
+        with self._lock:
+            if self._adiados and self._adiados[0][0] <= time.monotonic():
+                item = heapq.heappop(self._adiados)[2]
+                self._em_envio += 1
+                return item
+            if self._adiados:
+                espera = min(espera, max(0.0, self._adiados[0][0] - time.monotonic()))
+        try:
+            item = self._fila.get(timeout=max(espera, 0.01))
+        except queue.Empty:
+            return None
+        with self._lock:
+            self._em_envio += 1
+        return item
+
+    def _pegar_lote(self, espera):
+        """Monta um lote de até `lote` mensagens (bloqueia só pela primeira)."""
+        primeiro = self._proximo(espera)
+        if primeiro is None:
+            return []
+        itens = [primeiro]
+        while len(itens) < self.lote:
+            item = self._proximo(0)
+            if item is None:
+                break
+            itens.append(item)
+        return itens
+
+    def _conectar(self):
+        smtp = smtplib.SMTP(self.host, self.port, timeout=SMTP_TIMEOUT)
+        if self.starttls:
+            smtp.starttls()
+        if self.usuario:
+            smtp.login(self.usuario, self.senha)
+        with self._lock:
+            self._conexoes_abertas += 1
+        return smtp
+
+    def _fechar(self, smtp):
+        if smtp is None:
+            return
+        try:
+            smtp.quit()
+        except Exception:
+            smtp.close()
+        with self._lock:
+            self._conexoes_abertas -= 1
+
+    def _loop_worker(self):
+        smtp = None
+        ultimo_uso = time.monotonic()
+        while True:
+            itens = self._pegar_lote(espera=1.0)
+
+            # Fecha conexões ociosas (o servidor derrubaria de qualquer jeito)
+            if smtp is not None and time.monotonic() - ultimo_uso > SMTP_OCIOSO_MAX:
+                self._fechar(smtp)
+                smtp = None
+            if not itens:
+                continue
+
+            for item in itens:
+                inicio = time.perf_counter()
+                try:
+                    if smtp is None:
+                        smtp = self._conectar()
+                    smtp.send_message(item["msg"])
+                    registrar_span("smtp", time.perf_counter() - inicio)
+                    with self._lock:
+                        self._enviados += 1
+                        self._pendentes -= 1
+                    print(f"📨 E-mail enviado com sucesso para {item['msg']['To']}")
+                except Exception as e:
+                    # Conexão pode estar quebrada: descarta e reconecta na próxima
+                    self._fechar(smtp)
+                    smtp = None
+                    self._falhou(item, e)
+                finally:
+                    with self._lock:
+                        self._em_envio -= 1
+            ultimo_uso = time.monotonic()
+
+    def _falhou(self, item, erro):
+        """Agenda retentativa com backoff exponencial ou manda para os mortos."""
+        item["tentativa"] += 1
+        item["erro"] = repr(erro)
+        if item["tentativa"] >= self.tentativas:
+            print(f"⚠️ Erro ao enviar e-mail para {item['msg']['To']} (desistindo):", erro)
+            with self._lock:
+                self.mortos.append(item)
+                self._pendentes -= 1
+            return
+        atraso = self.backoff * (2 ** (item["tentativa"] - 1))
+        atraso += random.uniform(0, atraso / 2)  # jitter para não sincronizar retentativas
+        with self._lock:
+            self._seq += 1
+            self._retentativas += 1
+            heapq.heappush(self._adiados, (time.monotonic() + atraso, self._seq, item))
+
+
+# --- Instância única usada pelas rotas ---
+fila_email = FilaEmail()
+
+
+def enviar_email(destinatario, assunto, corpo):
+    """Enfileira o e-mail para envio em segundo plano."""
+    fila_email.enfileirar(destinatario, assunto, corpo)
+    return True
@@ -0,0 +1,315 @@
+"""
+Executor dedicado para o bcrypt (hash e verificação de senhas).
+
+O bcrypt com custo 12 gasta ~250 ms de CPU por chamada. Rodar isso direto
+na thread da requisição faz uma rajada de logins ocupar todas as threads
+do servidor. Aqui o trabalho vai para um pool próprio, com:
+- número de workers configurável (HASH_WORKERS);
+- fila limitada (HASH_FILA_MAX): se encher, a chamada falha na hora com
+  FilaHashCheia, e a rota responde "tente novamente" (503);
+- espera limitada (HASH_TIMEOUT): se o hash não sair a tempo, a chamada
+  desiste com HashDemorado (também uma FilaHashCheia, também 503). A vaga
+  só é devolvida quando o bcrypt termina de verdade;
+- métricas de profundidade da fila e latência (veja metricas()).
+
+O bcrypt libera o GIL enquanto calcula, então threads já aproveitam
+todos os núcleos.
+
+Custo do bcrypt (quantas rodadas, 2^custo):
+- BCRYPT_CUSTO fixa o custo; sem ele, calibrar_custo() mede esta máquina
+  e escolhe o maior custo que cabe em BCRYPT_ALVO_MS por hash (nunca abaixo
+  de BCRYPT_CUSTO_MIN);
+- hashes com custo menor que o da política são refeitos em segundo plano
+  depois de um login certo (precisa_rehash / rehash_em_segundo_plano), sem
+  obrigar ninguém a trocar de senha. Com custo calibrado, cada processo
+  mede o seu e dois deles podem discordar por 1: por isso só se sobe o
+  custo, nunca se desce (senão os dois reescreveriam o mesmo hash sem
+  parar). Com BCRYPT_CUSTO fixo, o valor é o mesmo em todo lugar e o hash
+  acompanha a política nos dois sentidos;
+- a calibração (~80 ms) só roda quando o custo é usado pela primeira vez;
+  o `flask serve` a faz no mestre, antes do fork, e os workers herdam.
+  Comandos que não mexem em senha não pagam por ela.
+"""
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturoTimeout
+from collections import deque
+from dotenv import load_dotenv
+from instrumentacao import registrar_span
+import threading
+import asyncio
+import bcrypt
+import time
+import os
+
+load_dotenv()
+
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", os.cpu_count() or 2))
+HASH_FILA_MAX = int(os.getenv("HASH_FILA_MAX", 32))
+HASH_TIMEOUT = float(os.getenv("HASH_TIMEOUT", 10))  # segundos
+
+BCRYPT_CUSTO = int(os.getenv("BCRYPT_CUSTO", 0))          # 0 = calibrar pelo alvo
+BCRYPT_ALVO_MS = float(os.getenv("BCRYPT_ALVO_MS", 250))  # tempo desejado por hash
+BCRYPT_CUSTO_MIN = int(os.getenv("BCRYPT_CUSTO_MIN", 10))
+BCRYPT_CUSTO_MAX = int(os.getenv("BCRYPT_CUSTO_MAX", 16))
+
+
+class FilaHashCheia(Exception):
+    """O executor de hash está saturado; o cliente deve tentar mais tarde."""
+
+
+class HashDemorado(FilaHashCheia):
+    """O hash não terminou em HASH_TIMEOUT segundos (executor sobrecarregado)."""
+
+
+class ExecutorHash:
+    """
+    Pool de threads para o bcrypt com controle de admissão.
+    - No máximo `workers` hashes rodando e `fila_max` esperando.
+    - O pool é criado na primeira chamada de cada processo (seguro após fork).
+    """
+
+    def __init__(self, workers=HASH_WORKERS, fila_max=HASH_FILA_MAX, timeout=HASH_TIMEOUT):
+        self.workers = workers
+        self.fila_max = fila_max
+        self.timeout = timeout
+        self._vagas = threading.BoundedSemaphore(workers + fila_max)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+
+        # --- Métricas ---
+        self._pendentes = 0        # rodando + esperando na fila
+        self._concluidos = 0
+        self._rejeitados = 0
+        self._latencia_total = 0.0  # soma das latências (espera + cálculo)
+        self._latencia_max = 0.0
+        self._latencias = deque(maxlen=1000)  # janela para percentis
+
+    def _pool(self):
+        """Retorna o ThreadPoolExecutor do processo atual, criando se preciso."""
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    # Depois de um fork as threads do pai não existem mais.
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.workers, thread_name_prefix="bcrypt"
+                    )
+                    self._vagas = threading.BoundedSemaphore(self.workers + self.fila_max)
+                    self._pendentes = 0
+                    self._pid = os.getpid()
+        return self._executor
+
+    def executar(self, funcao, *args):
+        """
+        Roda `funcao(*args)` no pool e espera o resultado.
+        Lança FilaHashCheia imediatamente se não houver vaga e HashDemorado
+        se o resultado não vier em `timeout` segundos.
+        """
+        futuro = self._submeter(funcao, *args)
+        inicio = time.perf_counter()
+        try:
+            return futuro.result(timeout=self.timeout)
+        except FuturoTimeout as e:
+            futuro.cancel()  # ainda na fila: nem chega a rodar
+            raise HashDemorado("Hash não terminou a tempo") from e
+        finally:
+            # Aqui, e não no callback: só esta thread tem a requisição (Server-Timing)
+            registrar_span("bcrypt", time.perf_counter() - inicio)
+
+    async def executar_async(self, funcao, *args):
+        """Igual a executar(), para código asyncio: espera sem prender uma thread."""
+        futuro = self._submeter(funcao, *args)
+        inicio = time.perf_counter()
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(futuro), self.timeout)
+        except asyncio.TimeoutError as e:
+            raise HashDemorado("Hash não terminou a tempo") from e
+        finally:
+            registrar_span("bcrypt", time.perf_counter() - inicio)
+
+    def agendar(self, funcao, *args):
+        """
+        Roda `funcao(*args)` no pool sem esperar (trabalho de fundo).
+        Retorna False, sem lançar, se não houver vaga.
+        """
+        try:
+            self._submeter(funcao, *args)
+        except FilaHashCheia:
+            return False
+        return True
+
+    def _submeter(self, funcao, *args):
+        """
+        Reserva uma vaga e manda `funcao(*args)` para o pool. A vaga volta
+        quando o trabalho termina (ou é cancelado), não quando quem esperava
+        desiste: um timeout não abre espaço para mais um bcrypt rodando.
+        """
+        pool = self._pool()
+        inicio = self._admitir()
+        try:
+            futuro = pool.submit(funcao, *args)
+        except BaseException:
+            self._finalizar(inicio)
+            raise
+        futuro.add_done_callback(lambda _: self._finalizar(inicio))
+        return futuro
+
+    def _admitir(self):
+        """Reserva uma vaga (ou lança FilaHashCheia) e retorna o instante de início."""
+        if not self._vagas.acquire(blocking=False):
+            with self._lock:
+                self._rejeitados += 1
+            raise FilaHashCheia("Fila de hash cheia")
+        with self._lock:
+            self._pendentes += 1
+        return time.perf_counter()
+
+    def _finalizar(self, inicio):
+        duracao = time.perf_counter() - inicio
+        with self._lock:
+            self._pendentes -= 1
+            self._concluidos += 1
+            self._latencia_total += duracao
+            self._latencia_max = max(self._latencia_max, duracao)
+            self._latencias.append(duracao)
+        self._vagas.release()
+
+    def metricas(self):
+        """Fotografia das métricas atuais (tempos em milissegundos)."""
+        with self._lock:
+            amostras = sorted(self._latencias)
+            pendentes = self._pendentes
+            concluidos = self._concluidos
+            rejeitados = self._rejeitados
+            total = self._latencia_total
+            maximo = self._latencia_max
+
+        def percentil(p):
+            if not amostras:
+                return 0.0
+            return round(amostras[min(len(amostras) - 1, int(len(amostras) * p))] * 1000, 2)
+
+        return {
+            "workers": self.workers,
+            "fila_max": self.fila_max,
+            "em_execucao": min(pendentes, self.workers),
+            "na_fila": max(0, pendentes - self.workers),
+            "concluidos": concluidos,
+            "rejeitados": rejeitados,
+            "latencia_media_ms": round(total / concluidos * 1000, 2) if concluidos else 0.0,
+            "latencia_max_ms": round(maximo * 1000, 2),
+            "latencia_p50_ms": percentil(0.50),
+            "latencia_p95_ms": percentil(0.95),
+            "custo_bcrypt": _custo or 0,
+            "rehashes": _rehashes,
+        }
+
+
+# --- Instância única usada pelas rotas ---
+executor_hash = ExecutorHash()
+
+
+# ==========================
+# ⚖️ CUSTO DO BCRYPT
+# ==========================
+_custo = BCRYPT_CUSTO or None
+_custo_lock = threading.Lock()
+_rehashes = 0
+
+
+def calibrar_custo(alvo_ms=BCRYPT_ALVO_MS):
+    """
+    Maior custo cujo hash leva até `alvo_ms` nesta máquina.
+    Mede o custo 8 (alguns ms) e extrapola: cada +1 no custo dobra o tempo.
+    """
+    amostras = []
+    for _ in range(3):
+        inicio = time.perf_counter()
+        bcrypt.hashpw(b"calibracao", bcrypt.gensalt(8))
+        amostras.append(time.perf_counter() - inicio)
+    ms_custo_8 = max(min(amostras) * 1000, 0.01)
+    custo = 8
+    while custo < BCRYPT_CUSTO_MAX and ms_custo_8 * 2 ** (custo + 1 - 8) <= alvo_ms:
+        custo += 1
+    return max(BCRYPT_CUSTO_MIN, custo)
+
+
+def custo_bcrypt():
+    """Custo da política atual (calibrado na primeira chamada, se não for fixo)."""
+    global _custo
+    if _custo is None:
+        with _custo_lock:
+            if _custo is None:
+                _custo = calibrar_custo()
+    return _custo
+
+
+def definir_custo(custo):
+    """Fixa o custo da política (ex.: benchmark, testes de carga)."""
+    global _custo
+    _custo = custo
+
+
+def custo_do_hash(hash_senha):
+    """Custo gravado no hash ("$2b$12$..." → 12). None se não for bcrypt."""
+    try:
+        return int(hash_senha.split("$")[2])
+    except (IndexError, ValueError):
+        return None
+
+
+def precisa_rehash(hash_senha):
+    """
+    True se o hash deve ser refeito com o custo da política: se o custo dele
+    for menor, ou diferente quando a política é fixa (BCRYPT_CUSTO).
+    """
+    custo = custo_do_hash(hash_senha)
+    if custo is None or custo < custo_bcrypt():
+        return True
+    return bool(BCRYPT_CUSTO) and custo != BCRYPT_CUSTO
+
+
+def _checar(senha, hash_senha):
+    return bcrypt.checkpw(senha.encode("utf-8"), hash_senha.encode("utf-8"))
+
+
+def _gerar(senha):
+    return bcrypt.hashpw(senha.encode("utf-8"), bcrypt.gensalt(custo_bcrypt())).decode("utf-8")
+
+
+def _refazer_hash(usuario_id, senha, hash_antigo):
+    global _rehashes
+    from database import Usuario, obter_engine
+    novo = _gerar(senha)
+    # Só troca se o hash ainda for o mesmo (a senha pode ter mudado nesse meio tempo)
+    with obter_engine().begin() as conn:
+        conn.execute(
+            Usuario.__table__.update()
+            .where(Usuario.id == usuario_id, Usuario.hash_senha == hash_antigo)
+            .values(hash_senha=novo)
+        )
+    with _custo_lock:
+        _rehashes += 1
+
+
+def rehash_em_segundo_plano(usuario_id, senha, hash_antigo):
+    """
+    Refaz o hash com o custo da política, sem atrasar o login.
+    Chame só depois de verificar a senha. Se o pool estiver cheio, fica para
+    o próximo login.
+    """
+    return executor_hash.agendar(_refazer_hash, usuario_id, senha, hash_antigo)
+
+
+def verificar_senha(senha, hash_senha):
+    """Confere a senha contra o hash salvo (no pool). Pode lançar FilaHashCheia."""
+    return executor_hash.executar(_checar, senha, hash_senha)
+
+
+def gerar_hash(senha):
+    """Gera o hash bcrypt da senha (no pool). Pode lançar FilaHashCheia."""
+    return executor_hash.executar(_gerar, senha)
+
+
+async def verificar_senha_async(senha, hash_senha):
+    """verificar_senha() para o modo assíncrono (asgi.py)."""
+    return await executor_hash.executar_async(_checar, senha, hash_senha)
@@ -0,0 +1,246 @@
+"""
+Instrumentação opcional do app: tempos por requisição e métricas.
+
+Ligue com METRICAS_ATIVAS=1 no .env. Desligado, span() não faz nada e
+nenhum hook é registrado (custo zero).
+
+Quando ligado:
+- cada requisição mede o tempo gasto no banco (eventos da engine do
+  SQLAlchemy), no bcrypt, na fila de e-mail e nos templates;
+- a resposta leva esses tempos no cabeçalho Server-Timing (aparece na aba
+  Network do navegador);
+- histogramas agregados ficam em /metrics, no formato texto do Prometheus;
+- com PROFILER_AMOSTRAGEM > 0, essa fração das requisições roda com o
+  cProfile e os perfis das mais lentas são gravados em PROFILER_PASTA.
+"""
+from contextlib import contextmanager
+from dotenv import load_dotenv
+from flask import g, request, has_request_context, before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+import threading
+import cProfile
+import pstats
+import random
+import heapq
+import time
+import io
+import os
+
+load_dotenv()
+
+METRICAS_ATIVAS = os.getenv("METRICAS_ATIVAS", "0").lower() in ("1", "true", "sim")
+PROFILER_AMOSTRAGEM = float(os.getenv("PROFILER_AMOSTRAGEM", 0))  # 0.01 = 1% das requisições
+PROFILER_PASTA = os.getenv("PROFILER_PASTA", "perfis")
+PROFILER_MANTER = int(os.getenv("PROFILER_MANTER", 10))  # quantos perfis lentos guardar
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+# ==========================
+# 📈 HISTOGRAMAS
+# ==========================
+class Histograma:
+    """Histograma cumulativo no estilo Prometheus (thread-safe)."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.contagens = [0] * len(buckets)
+        self.soma = 0.0
+        self.total = 0
+        self._lock = threading.Lock()
+
+    def observar(self, valor):
+        with self._lock:
+            self.soma += valor
+            self.total += 1
+            for i, limite in enumerate(self.buckets):
+                if valor <= limite:
+                    self.contagens[i] += 1
+                    break
+
+    def fotografia(self):
+        with self._lock:
+            return list(self.contagens), self.soma, self.total
+
+
+_metricas = {}  # nome -> {"ajuda": str, "series": {labels(tupla): Histograma}}
+_metricas_lock = threading.Lock()
+
+
+def observar(nome, valor, ajuda="", **labels):
+    """Registra `valor` (em segundos) no histograma `nome` com os labels dados."""
+    chave = tuple(sorted(labels.items()))
+    with _metricas_lock:
+        metrica = _metricas.setdefault(nome, {"ajuda": ajuda, "series": {}})
+        histograma = metrica["series"].get(chave)
+        if histograma is None:
+            histograma = metrica["series"][chave] = Histograma()
+    histograma.observar(valor)
+
+
+# ==========================
+# ⏱️ SPANS DA REQUISIÇÃO
+# ==========================
+def registrar_span(nome, segundos):
+    """
+    Soma `segundos` ao componente `nome`: no histograma e, se houver uma
+    requisição em andamento nesta thread, no Server-Timing dela.
+    """
+    if not METRICAS_ATIVAS:
+        return
+    observar("helpdesk_span_segundos", segundos, "Tempo gasto por componente.", componente=nome)
+    if has_request_context():
+        spans = g.get("_spans")
+        if spans is not None:
+            spans[nome] = spans.get(nome, 0.0) + segundos
+
+
+@contextmanager
+def span(nome):
+    """Mede o bloco e soma no tempo do componente `nome` da requisição atual."""
+    if not METRICAS_ATIVAS:
+        yield
+        return
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        registrar_span(nome, time.perf_counter() - inicio)
+
+
+# ==========================
+# 🔬 PROFILER POR AMOSTRAGEM
+# ==========================
+_mais_lentos = []  # heap de (duracao, arquivo): os PROFILER_MANTER mais lentos
+_perfis_lock = threading.Lock()
+
+
+def _guardar_perfil(perfil, duracao):
+    with _perfis_lock:
+        if len(_mais_lentos) >= PROFILER_MANTER and duracao <= _mais_lentos[0][0]:
+            return
+        os.makedirs(PROFILER_PASTA, exist_ok=True)
+        rota = (request.url_rule.rule if request.url_rule else request.path).strip("/").replace("/", "_") or "raiz"
+        nome = f"{int(duracao * 1000):06d}ms_{request.method}_{rota}_{int(time.time())}.txt"
+        caminho = os.path.join(PROFILER_PASTA, nome)
+
+        saida = io.StringIO()
+        saida.write(f"{request.method} {request.full_path} — {duracao * 1000:.1f} ms\n\n")
+        pstats.Stats(perfil, stream=saida).sort_stats("cumulative").print_stats(40)
+        with open(caminho, "w", encoding="utf-8") as arquivo:
+            arquivo.write(saida.getvalue())
+
+        heapq.heappush(_mais_lentos, (duracao, caminho))
+        if len(_mais_lentos) > PROFILER_MANTER:
+            _, removido = heapq.heappop(_mais_lentos)
+            try:
+                os.remove(removido)
+            except OSError:
+                pass
+
+
+# ==========================
+# 🔌 LIGAÇÃO COM O APP
+# ==========================
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(pares):
+    if not pares:
+        return ""
+    return "{" + ",".join(f'{k}="{_escapar(v)}"' for k, v in pares) + "}"
+
+
+def texto_prometheus(fontes=None):
+    """Gera o texto de /metrics (histogramas + valores atuais das `fontes`)."""
+    linhas = []
+    with _metricas_lock:
+        metricas = {nome: (m["ajuda"], dict(m["series"])) for nome, m in _metricas.items()}
+
+    for nome, (ajuda, series) in sorted(metricas.items()):
+        linhas.append(f"# HELP {nome} {ajuda}")
+        linhas.append(f"# TYPE {nome} histogram")
+        for chave, histograma in sorted(series.items()):
+            contagens, soma, total = histograma.fotografia()
+            acumulado = 0
+            for limite, contagem in zip(histograma.buckets, contagens, strict=True):
+                acumulado += contagem
+                linhas.append(f"{nome}_bucket{_labels(chave + (('le', limite),))} {acumulado}")
+            linhas.append(f"{nome}_bucket{_labels(chave + (('le', '+Inf'),))} {total}")
+            linhas.append(f"{nome}_sum{_labels(chave)} {soma}")
+            linhas.append(f"{nome}_count{_labels(chave)} {total}")
+
+    # Valores atuais dos componentes (fila do hash, fila de e-mail, cache...)
+    for grupo, funcao in (fontes or {}).items():
+        for chave, valor in sorted(funcao().items()):
+            if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+                nome = f"helpdesk_{grupo}_{chave}"
+                linhas.append(f"# TYPE {nome} gauge")
+                linhas.append(f"{nome} {valor}")
+    return "\n".join(linhas) + "\n"
+
+
+def init_app(app, fontes=None):
+    """
+    Registra os hooks de medição e a rota /metrics (só com METRICAS_ATIVAS=1).
+    `fontes`: {"grupo": função que retorna um dict de números}.
+    """
+    if not METRICAS_ATIVAS:
+        return
+
+    # --- Banco: vale para qualquer engine criada depois ---
+    @event.listens_for(Engine, "before_cursor_execute")
+    def _antes_sql(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("_inicio_sql", []).append(time.perf_counter())
+
+    @event.listens_for(Engine, "after_cursor_execute")
+    def _depois_sql(conn, cursor, statement, parameters, context, executemany):
+        registrar_span("db", time.perf_counter() - conn.info["_inicio_sql"].pop())
+
+    # --- Templates ---
+    def _antes_template(sender, template, context, **extra):
+        g._inicio_template = time.perf_counter()
+
+    def _depois_template(sender, template, context, **extra):
+        registrar_span("template", time.perf_counter() - g.pop("_inicio_template"))
+
+    before_render_template.connect(_antes_template, app, weak=False)
+    template_rendered.connect(_depois_template, app, weak=False)
+
+    # --- Requisição ---
+    @app.before_request
+    def _iniciar_medicao():
+        g._spans = {}
+        g._inicio_requisicao = time.perf_counter()
+        g._perfil = None
+        if PROFILER_AMOSTRAGEM and random.random() < PROFILER_AMOSTRAGEM:
+            g._perfil = cProfile.Profile()
+            g._perfil.enable()
+
+    @app.after_request
+    def _finalizar_medicao(resposta):
+        inicio = g.get("_inicio_requisicao")
+        if inicio is None:
+            return resposta
+        duracao = time.perf_counter() - inicio
+
+        perfil = g.pop("_perfil", None)
+        if perfil is not None:
+            perfil.disable()
+            _guardar_perfil(perfil, duracao)
+
+        rota = request.url_rule.rule if request.url_rule else "desconhecida"
+        observar("helpdesk_requisicao_segundos", duracao, "Latência das requisições HTTP.",
+                 rota=rota, metodo=request.method, status=resposta.status_code)
+
+        partes = [f"{nome};dur={segundos * 1000:.2f}" for nome, segundos in g.get("_spans", {}).items()]
+        partes.append(f"total;dur={duracao * 1000:.2f}")
+        resposta.headers["Server-Timing"] = ", ".join(partes)
+        return resposta
+
+    @app.route("/metrics")
+    def metrics():
+        """Métricas no formato texto do Prometheus."""
+        return texto_prometheus(fontes), 200, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
@@ -0,0 +1,57 @@
+"""
+Limitador de tentativas de login por janela deslizante.
+
+Conta falhas por chave (e-mail ou IP) numa janela de tempo que "desliza":
+a contagem é a janela atual somada a uma fração da anterior, proporcional
+ao quanto da janela anterior ainda está dentro do período. Assim o bloqueio
+vai diminuindo sozinho com o tempo, sem reset brusco.
+
+- Memória O(1) por chave: só dois contadores (janela atual e anterior).
+- Os contadores ficam no armazenamento TTL (armazenamento.py) e expiram
+  sozinhos depois de duas janelas; com ARMAZENAMENTO=sqlite, todos os
+  workers compartilham os mesmos limites.
+- bloqueado() é só leitura e deve ser chamado antes de qualquer consulta
+  ao banco ou bcrypt.
+"""
+import math
+import time
+
+
+class LimitadorJanela:
+    """Janela deslizante aproximada com dois contadores por chave."""
+
+    def __init__(self, armazenamento, prefixo, limite, janela):
+        self.armazenamento = armazenamento
+        self.prefixo = prefixo
+        self.limite = limite
+        self.janela = janela  # segundos
+
+    def _chaves(self, chave, agora):
+        indice = int(agora // self.janela)
+        return (
+            f"{self.prefixo}:{chave}:{indice}",
+            f"{self.prefixo}:{chave}:{indice - 1}",
+            (agora % self.janela) / self.janela,  # fração já decorrida da janela atual
+        )
+
+    def contagem(self, chave):
+        """Falhas estimadas dentro da última janela."""
+        atual, anterior, decorrido = self._chaves(chave, time.time())
+        return (self.armazenamento.obter(atual) or 0) + (self.armazenamento.obter(anterior) or 0) * (1 - decorrido)
+
+    def bloqueado(self, chave):
+        return self.contagem(chave) >= self.limite
+
+    def restantes(self, chave):
+        """Quantas falhas ainda são aceitas antes do bloqueio."""
+        return max(0, self.limite - math.ceil(self.contagem(chave)))
+
+    def registrar_falha(self, chave):
+        atual, _, _ = self._chaves(chave, time.time())
+        # Vive duas janelas: ainda conta (parcialmente) na janela seguinte
+        self.armazenamento.incrementar(atual, ttl=2 * self.janela)
+
+    def limpar(self, chave):
+        atual, anterior, _ = self._chaves(chave, time.time())
+        self.armazenamento.remover(atual)
+        self.armazenamento.remover(anterior)
@@ -1,17 +1,17 @@
 from flask import Flask, render_template, request, redirect, url_for, session, flash
 # --- CORREÇÃO DE IMPORT ---
 # Importamos Usuario e session direto do 'database.py', que é onde eles são criados.
-from database import Usuario, session as db_session
+from database import Usuario, init_db, session as db_session
+from fila_email import enviar_email
+from hashing import gerar_hash
+from validacao import erros_email, erros_senha
+from assets import init_assets
+from cache_templates import init_templates
 from dotenv import load_dotenv
-from email.message import EmailMessage
 # Import 'datetime' e 'timedelta'
 from datetime import datetime, timedelta, UTC 
 import bcrypt
-import os
-import smtplib
 import random
-# Imports que faltavam para a rota de cadastro
-import re 
 
 codigos_2fa = {}  # armazena temporariamente os códigos enviados
 falhas_login = {} # NOVO: armazena as tentativas de login
@@ -21,16 +21,17 @@ LIMITE_FALHAS = 5 # NOVO: define o limite de tentativas
 # 🔧 CONFIGURAÇÃO DO FLASK
 # ==========================
 app = Flask(__name__)
+init_templates(app)  # bytecode em disco + sidebar() dos templates
+init_assets(app)  # asset_url(): CSS minificado, versionado e com cache de 1 ano
 app.secret_key = "segredo_super_seguro"  # 🔒 usada para proteger sessões
+init_db(app)  # Session do banco por requisição
 
 # ==========================
 # 📬 CONFIGURAÇÃO DO E-MAIL (2FA)
 # ==========================
+# As variáveis SMTP_* do .env são lidas em fila_email.py, que faz o envio
+# em segundo plano com conexões reaproveitadas.
 load_dotenv()
-SMTP_HOST = os.getenv("SMTP_HOST")
-SMTP_PORT = int(os.getenv("SMTP_PORT", 587))
-SMTP_USER = os.getenv("SMTP_USER")
-SMTP_PASS = os.getenv("SMTP_PASS")
 
 # ==========================
 # 🔐 CONFIGURAÇÃO DO 2FA
@@ -60,16 +61,14 @@ def cadastro():
         
         # 2. Validação (lógica adaptada do seu cadastros.py)
         
-        # 2.1. Validação de e-mail
-        padrao_email = r'^[\w\.-]+@[\w\.-]+\.\w+$'
-        if not re.fullmatch(padrao_email, email):
-            flash("E-mail inválido! (Ex: usuario@dominio.com)", "erro")
-            return redirect(url_for("cadastro"))
-
-        # 2.2. Validação de força da senha
-        padrao_senha = r'^(?=.*[a-z])(?=.*[A-Z])(?=.*\d)(?=.*[@#$%&*!?]).{8,}$'
-        if not re.fullmatch(padrao_senha, senha):
-            flash("Senha inválida! (Deve ter 8+ caracteres, maiúscula, minúscula, número e especial @#$%&*!?)", "erro_senha")
+        # 2.1 e 2.2. E-mail e força da senha (todas as regras de uma vez)
+        problemas = erros_email(email)
+        regras_senha = erros_senha(senha)
+        if regras_senha:
+            problemas.append("Senha inválida! Requisitos não atendidos: " + ", ".join(regras_senha).lower() + ".")
+        if problemas:
+            for mensagem in problemas:
+                flash(mensagem, "erro")
             return redirect(url_for("cadastro"))
 
         # 2.3. Confirmação de senha
@@ -90,7 +89,7 @@ def cadastro():
             return redirect(url_for("cadastro"))
 
         # 3. Criação do Hash da Senha
-        hash_senha = bcrypt.hashpw(senha.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+        hash_senha = gerar_hash(senha)  # custo da política atual (hashing.py)
 
         # 4. Criação do novo usuário
         novo_usuario = Usuario(
@@ -117,23 +116,8 @@ def cadastro():
 
 
 # ---------------- EMAIL -----------------
-def enviar_email(destinatario, assunto, corpo):
-    # (Seu código original, está ótimo)
-    msg = EmailMessage()
-    msg["From"] = SMTP_USER
-    msg["To"] = destinatario
-    msg["Subject"] = assunto
-    msg.set_content(corpo)
-    try:
-        with smtplib.SMTP(SMTP_HOST, SMTP_PORT) as smtp:
-            smtp.starttls()
-            smtp.login(SMTP_USER, SMTP_PASS)
-            smtp.send_message(msg)
-        print(f"📨 E-mail enviado com sucesso para {destinatario}")
-        return True
-    except Exception as e:
-        print("⚠️ Erro ao enviar e-mail:", e)
-        return False
+# enviar_email (importado de fila_email) só coloca a mensagem na fila;
+# o envio SMTP acontece em segundo plano, fora da requisição.
 
 
 # ---------------- LOGIN -----------------
@@ -1,46 +1,86 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash
+from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify
+from werkzeug.middleware.proxy_fix import ProxyFix
 # --- CORREÇÃO DE IMPORT ---
 # Importamos Usuario e session direto do 'database.py', que é onde eles são criados.
-from database import Usuario, session as db_session
+from database import Usuario, STATUS_TICKET, init_db, session as db_session
+from hashing import verificar_senha, gerar_hash, executor_hash, FilaHashCheia
+from fila_email import fila_email
+from autenticacao import (
+    ip_cliente, consulta_usuario,
+    resposta_bloqueio, resposta_ocupado, resposta_senha_incorreta, concluir_login,
+    tela_mfa, resposta_bloqueio_mfa, passo_totp, resposta_totp_incorreto, concluir_mfa_totp,
+    conferir_codigo_email, concluir_mfa_email, confirmar_identidade,
+)
+from validacao import erros_email, erros_senha
+from sessoes import init_sessoes
+from assets import init_assets
+from cache_templates import init_templates, cache_fragmentos
+from cache_paginas import renderizar_pagina, cache_paginas
+from usuarios_lote import registrar_comandos
+from servidor import registrar_servidor
+from cache_usuario import carregar_perfil, invalidar_perfil, cache_usuarios
+import instrumentacao
+import totp
+import auditoria
+from auditoria import auditar, registro_auditoria, registrar_comando_auditoria
+from purga import marcar_exclusao, purgador, init_purga
+from tickets import listar_tickets, buscar_ticket, normalizar_por_pagina, normalizar_status, resumo_painel
 from dotenv import load_dotenv
-from email.message import EmailMessage
-from datetime import datetime, timedelta, timezone
-import bcrypt
+from datetime import timedelta
 import os
-import smtplib
-import random
-# Imports que faltavam para a rota de cadastro
-import re 
-
-codigos_2fa = {}  # armazena temporariamente os códigos enviados
-falhas_login = {} # NOVO: armazena as tentativas de login
-LIMITE_FALHAS = 5 # NOVO: define o limite de tentativas
 
 # ==========================
 # 🔧 CONFIGURAÇÃO DO FLASK
 # ==========================
 app = Flask(__name__)
-app.secret_key = "segredo_super_seguro"  # 🔒 usada para proteger sessões
-
-# --- NOVO: EXPIRAÇÃO DE SESSÃO ---
-# Define que a sessão expira após 30 minutos de inatividade.
-app.permanent_session_lifetime = timedelta(minutes=1)
-# --- FIM DA NOVA LINHA ---
+# Bytecode dos templates em disco + sidebar() com cache (veja cache_templates.py)
+init_templates(app)
+init_assets(app)  # asset_url(): CSS minificado, versionado e com cache de 1 ano
+# 🔒 Assina os cookies de sessão. Em produção defina SECRET_KEY no .env
+# (o valor padrão abaixo é só para desenvolvimento).
+app.secret_key = os.getenv("SECRET_KEY") or "segredo_super_seguro"
+
+# --- EXPIRAÇÃO DE SESSÃO ---
+# Define que a sessão expira após SESSAO_MINUTOS (padrão 1) de inatividade.
+app.permanent_session_lifetime = timedelta(minutes=int(os.getenv("SESSAO_MINUTOS", 1)))
+
+# --- PROXY REVERSO ---
+# Atrás de nginx/balanceador, request.remote_addr é o IP do proxy: todos os
+# clientes cairiam no mesmo contador do limitador de login e na auditoria.
+# PROXY_SALTOS = quantos proxies confiáveis há na frente do app (0 = nenhum);
+# o IP real sai do X-Forwarded-For. Não ligue sem proxy: o cabeçalho seria
+# do próprio cliente, que poderia trocar de IP à vontade.
+PROXY_SALTOS = int(os.getenv("PROXY_SALTOS", 0))
+if PROXY_SALTOS:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=PROXY_SALTOS, x_proto=PROXY_SALTOS)
+
+# Onde ficam as sessões: cookie assinado (padrão) ou tabela no banco
+# (SESSAO_BACKEND=sql). Veja sessoes.py.
+init_sessoes(app)
 
 # ==========================
 # 📬 CONFIGURAÇÃO DO E-MAIL (2FA)
 # ==========================
+# As variáveis SMTP_* do .env são lidas em fila_email.py, que faz o envio
+# em segundo plano com conexões reaproveitadas.
 load_dotenv()
-SMTP_HOST = os.getenv("SMTP_HOST")
-SMTP_PORT = int(os.getenv("SMTP_PORT", 587))
-SMTP_USER = os.getenv("SMTP_USER")
-SMTP_PASS = os.getenv("SMTP_PASS")
 
 # ==========================
 # 🔐 CONFIGURAÇÃO DO 2FA
 # ==========================
-CODIGO_EXPIRA_MINUTOS = 5  # tempo de validade do código
-# A linha duplicada de 'codigos_2fa' foi removida daqui.
+# Código por e-mail (CODIGO_EXPIRA_MINUTOS), limitador de falhas e
+# armazenamento dos códigos: veja autenticacao.py.
+
+# ==========================
+# 🗄️ BANCO DE DADOS
+# ==========================
+# Session por requisição + comando `flask --app main criar-tabelas`.
+# Nada conecta no banco até a primeira consulta.
+init_db(app)
+registrar_comandos(app)  # flask importar-usuarios / exportar-usuarios
+registrar_servidor(app)  # flask serve (produção, veja servidor.py)
+registrar_comando_auditoria(app)  # flask auditoria (consulta o log de segurança)
+init_purga(app)  # exclusões de conta em segundo plano + flask purgar-contas
 
 # ==========================
 # 🚀 NOVAS ROTAS (CADASTRO)
@@ -64,16 +104,14 @@ def cadastro():
         
         # 2. Validação (lógica adaptada do seu cadastros.py)
         
-        # 2.1. Validação de e-mail
-        padrao_email = r'^[\w\.-]+@[\w\.-]+\.\w+$'
-        if not re.fullmatch(padrao_email, email):
-            flash("E-mail inválido! (Ex: usuario@dominio.com)", "erro")
-            return redirect(url_for("cadastro"))
-
-        # 2.2. Validação de força da senha
-        padrao_senha = r'^(?=.*[a-z])(?=.*[A-Z])(?=.*\d)(?=.*[@#$%&*!?]).{8,}$'
-        if not re.fullmatch(padrao_senha, senha):
-            flash("Senha inválida! (Deve ter 8+ caracteres, maiúscula, minúscula, número e especial @#$%&*!?)", "erro_senha")
+        # 2.1 e 2.2. E-mail e força da senha (todas as regras de uma vez)
+        problemas = erros_email(email)
+        regras_senha = erros_senha(senha)
+        if regras_senha:
+            problemas.append("Senha inválida! Requisitos não atendidos: " + ", ".join(regras_senha).lower() + ".")
+        if problemas:
+            for mensagem in problemas:
+                flash(mensagem, "erro")
             return redirect(url_for("cadastro"))
 
         # 2.3. Confirmação de senha
@@ -89,12 +127,19 @@ def cadastro():
 
         # 2.5. Verifica se o e-mail já existe (era 2.4)
         usuario_existente = db_session.query(Usuario).filter_by(email=email).first()
+        if usuario_existente and usuario_existente.excluido_em:
+            flash("Esta conta está sendo excluída. Tente novamente em alguns minutos.", "erro")
+            return redirect(url_for("cadastro"))
         if usuario_existente:
             flash("Este e-mail já está cadastrado. Tente fazer login.", "erro")
             return redirect(url_for("cadastro"))
 
-        # 3. Criação do Hash da Senha
-        hash_senha = bcrypt.hashpw(senha.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+        # 3. Criação do Hash da Senha (no executor de hash, fora da thread da requisição)
+        try:
+            hash_senha = gerar_hash(senha)
+        except FilaHashCheia:
+            flash("Servidor ocupado no momento. Tente novamente em alguns segundos.", "erro")
+            return redirect(url_for("cadastro"))
 
         # 4. Criação do novo usuário
         novo_usuario = Usuario(
@@ -116,96 +161,50 @@ def cadastro():
             flash("❌ Erro inesperado ao criar cadastro. Tente novamente.", "erro")
             return redirect(url_for("cadastro"))
 
-    # Se o método for GET, apenas mostre a página de cadastro
-    return render_template("cadastro.html")
+    # Se o método for GET, apenas mostre a página de cadastro (do cache, se não houver flash)
+    return renderizar_pagina("cadastro.html")
 
 
 # ---------------- EMAIL -----------------
-def enviar_email(destinatario, assunto, corpo):
-    # (Seu código original, está ótimo)
-    msg = EmailMessage()
-    msg["From"] = SMTP_USER
-    msg["To"] = destinatario
-    msg["Subject"] = assunto
-    msg.set_content(corpo)
-    try:
-        with smtplib.SMTP(SMTP_HOST, SMTP_PORT) as smtp:
-            smtp.starttls()
-            smtp.login(SMTP_USER, SMTP_PASS)
-            smtp.send_message(msg)
-        print(f"📨 E-mail enviado com sucesso para {destinatario}")
-        return True
-    except Exception as e:
-        print("⚠️ Erro ao enviar e-mail:", e)
-        return False
+# enviar_email (importado de fila_email) só coloca a mensagem na fila;
+# o envio SMTP acontece em segundo plano, fora da requisição.
 
 
 # ---------------- LOGIN -----------------
+# As etapas (bloqueio, falha, 2FA, auditoria) ficam em autenticacao.py e são
+# as mesmas das rotas assíncronas de asgi.py.
 @app.route("/", methods=["GET", "POST"])
 def login():
     """
     Página de login.
     - Verifica e-mail e senha no banco.
-    - Se o 2FA estiver ativo, envia o código por e-mail e redireciona para /mfa.
+    - Se o 2FA estiver ativo, envia o código por e-mail (ou pede o do
+      aplicativo) e redireciona para /mfa.
     """
     if request.method == "POST":
-        email = request.form["email"].lower()
-        senha = request.form["senha"]
+        email = request.form.get("email", "").lower()
+        senha = request.form.get("senha", "")
+        ip = ip_cliente()
 
-        # --- NOVO BLOCO: VERIFICAÇÃO DE BLOQUEIO ---
-        # .get(email, 0) significa "tente pegar o valor de falhas[email], se não existir, use 0"
-        if falhas_login.get(email, 0) >= LIMITE_FALHAS:
-            flash("Esta conta está temporariamente bloqueada por excesso de tentativas.", "erro")
-            return render_template("login.html")
-        # --- FIM DO BLOCO ---
+        # IP ou e-mail bloqueados → 429, antes do banco e do bcrypt
+        bloqueio = resposta_bloqueio(email, ip)
+        if bloqueio is not None:
+            return bloqueio
 
-        usuario = db_session.query(Usuario).filter_by(email=email).first()
-        
-        # (Corrigido) Use .encode() nas duas partes do bcrypt.checkpw
-        if not usuario or not bcrypt.checkpw(senha.encode('utf-8'), usuario.hash_senha.encode('utf-8')):
-            
-            # --- NOVO BLOCO: INCREMENTO DE FALHA ---
-            # Se o login falhou, adiciona +1 ao contador desse e-mail
-            falhas_login[email] = falhas_login.get(email, 0) + 1
-            tentativas_restantes = LIMITE_FALHAS - falhas_login[email]
-            
-            if tentativas_restantes > 0:
-                flash(f"E-mail ou senha incorretos. {tentativas_restantes} tentativas restantes.", "erro")
-            else:
-                flash("E-mail ou senha incorretos. A conta foi bloqueada.", "erro")
-            # --- FIM DO BLOCO ---
-            
-            return render_template("login.html")
-
-        # --- NOVO BLOCO: LIMPA FALHAS NO SUCESSO ---
-        # Se o login foi bem-sucedido, zeramos o contador de falhas para aquele e-mail
-        if email in falhas_login:
-            del falhas_login[email]
-        # --- FIM DO BLOCO ---
-
-        # Se 2FA ativo → gera e envia código
-        if usuario.twofa_ativo:
-            codigo = f"{random.randint(100000, 999999):06d}"
-            expira = datetime.now(timezone.utc) + timedelta(minutes=CODIGO_EXPIRA_MINUTOS)
-            codigos_2fa[email] = {"codigo": codigo, "expira": expira}
-
-            corpo = (
-                f"Olá, {usuario.nome}!\n\n"
-                f"Seu código de autenticação é: {codigo}\n"
-                f"Este código expira em {CODIGO_EXPIRA_MINUTOS} minutos."
-            )
-
-            enviar_email(email, "Código de autenticação 2FA", corpo)
-            session["email_temp"] = email
-            return redirect(url_for("mfa"))
-
-        # Se 2FA desativado → login direto
-        session["usuario_id"] = usuario.id
-        # --- NOVO: MARCA A SESSÃO PARA EXPIRAR ---
-        session.permanent = True
-        return redirect(url_for("dashboard"))
-
-    return render_template("login.html")
+        usuario = db_session.execute(consulta_usuario(email)).first()
+
+        # O bcrypt roda no executor de hash; se ele estiver saturado,
+        # respondemos na hora (503) em vez de prender a thread.
+        try:
+            senha_ok = usuario is not None and verificar_senha(senha, usuario.hash_senha)
+        except FilaHashCheia:
+            return resposta_ocupado()
+
+        if not senha_ok:
+            return resposta_senha_incorreta(usuario, email, ip)
+        return concluir_login(usuario, email, senha, ip)
+
+    return renderizar_pagina("login.html")
 
 
 # ---------------- AUTENTICAÇÃO 2FA -----------------
@@ -213,37 +212,34 @@ def login():
 def mfa():
     """
     Página de validação do código 2FA.
-    - Verifica se o código digitado é válido e ainda não expirou.
+    - Por e-mail: verifica se o código digitado é válido e ainda não expirou.
+    - Por aplicativo (TOTP): calcula o código a partir do segredo do usuário.
     """
     email_temp = session.get("email_temp")
     if not email_temp:
         return redirect(url_for("login"))
+    if request.method != "POST":
+        return tela_mfa()
+
+    ip = ip_cliente()
+    codigo = request.form.get("codigo", "")
+    if session.get("mfa_totp"):
+        bloqueio = resposta_bloqueio_mfa(email_temp, ip)
+        if bloqueio is not None:
+            return bloqueio
+        usuario = db_session.execute(consulta_usuario(email_temp)).first()
+        passo = passo_totp(usuario, codigo)
+        # UPDATE condicional: o mesmo código não entra duas vezes
+        if passo and db_session.execute(totp.comando_uso(usuario.id, passo)).rowcount == 1:
+            db_session.commit()
+            return concluir_mfa_totp(usuario, email_temp, ip)
+        return resposta_totp_incorreto(usuario, email_temp, ip)
 
-    if request.method == "POST":
-        codigo_inserido = request.form["codigo"]
-        entrada = codigos_2fa.get(email_temp)
-
-        if not entrada:
-            flash("Código expirado. Faça login novamente.", "erro")
-            return redirect(url_for("login"))
-
-        if datetime.now(timezone.utc) > entrada["expira"]:
-            del codigos_2fa[email_temp]
-            flash("Código expirado.", "erro")
-            return redirect(url_for("login"))
-
-        if codigo_inserido == entrada["codigo"]:
-            usuario = db_session.query(Usuario).filter_by(email=email_temp).first()
-            session["usuario_id"] = usuario.id
-            del session["email_temp"]
-            del codigos_2fa[email_temp]
-            # --- NOVO: MARCA A SESSÃO PARA EXPIRAR ---
-            session.permanent = True
-            return redirect(url_for("dashboard"))
-
-        flash("Código incorreto.", "erro")
-
-    return render_template("2mfa.html")
+    erro = conferir_codigo_email(email_temp, codigo, ip)
+    if erro is not None:
+        return erro
+    usuario = db_session.execute(consulta_usuario(email_temp)).first()
+    return concluir_mfa_email(usuario, email_temp, ip)
 
 
 # ---------------- DASHBOARD (PAINEL) -----------------
@@ -251,69 +247,85 @@ def mfa():
 def dashboard():
     """
     Página principal após login.
-    Mostra informações do usuário logado.
+    Mostra o usuário logado, quantos tickets ele tem em cada status e os mais recentes.
     """
     if "usuario_id" not in session:
         return redirect(url_for("login"))
 
-    usuario = db_session.query(Usuario).filter_by(id=session["usuario_id"]).first()
-    
-    # Esta página agora está "limpa". Os tickets foram movidos.
-    return render_template("dashboard.html", usuario=usuario)
+    # Usuário + contagem por status + tickets recentes numa só consulta
+    resumo = resumo_painel(session["usuario_id"])
+    if resumo is None:
+        session.clear()
+        return redirect(url_for("login"))
+
+    return render_template(
+        "dashboard.html",
+        usuario=resumo.usuario,
+        contagens=resumo.contagens,
+        tickets=resumo.recentes,
+        rotulos=STATUS_TICKET,
+    )
 
 # ---------------- MEUS TICKETS -----------------
 @app.route("/meus_tickets")
 def meus_tickets():
     """
-    Mostra a lista de tickets (falsos) do usuário.
+    Mostra os tickets do usuário, uma página por vez.
+    - ?por_pagina=N define o tamanho da página (máx. POR_PAGINA_MAX).
+    - ?depois=<cursor> busca a página seguinte (paginação por cursor).
+    - ?status=open|in_progress|closed e ?q=palavras filtram no banco.
+    - ?fragmento=1 devolve só a lista (usado pelo filtro/busca da página).
     """
     if "usuario_id" not in session:
         return redirect(url_for("login"))
 
-    usuario = db_session.query(Usuario).filter_by(id=session["usuario_id"]).first()
-
-    # --- DADOS FALSOS (MOCK) PARA APRESENTAÇÃO ---
-    tickets_falsos = [
-        {
-            "id": 1, 
-            "assunto": "Impressora laser não conecta à rede", 
-            "solicitante": "Ana Julia", 
-            "status": "open", "status_label": "Aberto", 
-            "criado_em": datetime.now() - timedelta(hours=1)
-        },
-        {
-            "id": 2, 
-            "assunto": "E-mail corporativo bloqueado", 
-            "solicitante": "Marcos Silva", 
-            "status": "open", "status_label": "Aberto", 
-            "criado_em": datetime.now() - timedelta(hours=3)
-        },
-        {
-            "id": 3, 
-            "assunto": "Computador lento ao iniciar o Windows", 
-            "solicitante": "Carla Dias", 
-            "status": "open", "status_label": "Aberto", 
-            "criado_em": datetime.now() - timedelta(days=1)
-        },
-        {
-            "id": 4, 
-            "assunto": "Solicitação de acesso à pasta 'Financeiro'", 
-            "solicitante": "Ricardo Mendes", 
-            "status": "open", "status_label": "Aberto", 
-            "criado_em": datetime.now() - timedelta(days=1, hours=2)
-        },
-        {
-            "id": 5, 
-            "assunto": "Mouse sem fio parou de funcionar", 
-            "solicitante": "Fernanda Lima", 
-            "status": "open", "status_label": "Aberto", 
-            "criado_em": datetime.now() - timedelta(days=2)
-        }
-    ]
-    # --- FIM DOS DADOS FALSOS ---
-
-    # Envia os tickets para o novo template
-    return render_template("meus_tickets.html", usuario=usuario, tickets=tickets_falsos)
+    usuario = carregar_perfil(session["usuario_id"])
+    if usuario is None:  # conta excluída (veja purga.py)
+        session.clear()
+        return redirect(url_for("login"))
+
+    por_pagina = normalizar_por_pagina(request.args.get("por_pagina", type=int))
+    depois = request.args.get("depois")
+    status = normalizar_status(request.args.get("status"))
+    busca = request.args.get("q", "").strip() or None
+    tickets, proximo_cursor = listar_tickets(usuario.id, por_pagina, depois, status, busca)
+
+    contexto = dict(
+        tickets=tickets,
+        proximo_cursor=proximo_cursor,
+        por_pagina=por_pagina,
+        pagina_inicial=not depois,
+        status=status,
+        busca=busca,
+    )
+    if request.args.get("fragmento"):
+        return render_template("_tickets_lista.html", **contexto)
+
+    # Envia os tickets para o template
+    return render_template("meus_tickets.html", usuario=usuario, **contexto)
+
+# ---------------- API: DETALHE DO TICKET -----------------
+@app.route("/api/tickets/<int:ticket_id>")
+def api_ticket(ticket_id):
+    """
+    Retorna um ticket em JSON (usado pelo modal de /meus_tickets).
+    - Responde com ETag; se o navegador mandar If-None-Match igual, devolve 304.
+    """
+    if "usuario_id" not in session:
+        return jsonify({"erro": "não autenticado"}), 401
+
+    ticket = buscar_ticket(session["usuario_id"], ticket_id)
+    if ticket is None:
+        return jsonify({"erro": "ticket não encontrado"}), 404
+
+    dados = ticket.como_dict()
+    dados["criado_em"] = ticket.criado_em.isoformat()
+
+    resposta = jsonify(dados)
+    resposta.add_etag()  # hash do conteúdo: muda só quando o ticket muda
+    resposta.cache_control.private = True
+    resposta.cache_control.no_cache = True  # pode guardar, mas revalida com o ETag
+    return resposta.make_conditional(request)
 
 # ---------------- CONFIGURAÇÕES -----------------
 @app.route("/configuracoes")
@@ -326,40 +338,187 @@ def configuracoes():
     if "usuario_id" not in session:
         return redirect(url_for("login"))
 
-    # 2. Busca o usuário no banco
-    usuario = db_session.query(Usuario).filter_by(id=session["usuario_id"]).first()
-    
-    # 3. Mostra a nova página de configurações
-    return render_template("configuracoes.html", usuario=usuario)
+    # 2. Busca o perfil do usuário (cache; vai ao banco só se expirou)
+    usuario = carregar_perfil(session["usuario_id"])
+    if usuario is None:  # conta excluída (veja purga.py)
+        session.clear()
+        return redirect(url_for("login"))
+
+    # 3. Cadastro do aplicativo autenticador em andamento: mostra a chave e o QR code
+    cadastro_totp = None
+    segredo = session.get("totp_pendente")
+    if segredo:
+        uri = totp.uri_provisionamento(segredo, usuario.email)
+        cadastro_totp = {"segredo": segredo, "uri": uri, "qr": totp.qr_svg(uri)}
+
+    # 4. Mostra a nova página de configurações
+    return render_template("configuracoes.html", usuario=usuario, cadastro_totp=cadastro_totp)
 
 # ---------------- ATIVAR/DESATIVAR 2FA -----------------
 @app.route("/ativar_2fa", methods=["POST"])
 def ativar_2fa():
     """
     Ativa ou desativa o 2FA para o usuário logado.
+    Desativar pede a senha ou o código do aplicativo (campo "confirmacao").
     """
     if "usuario_id" not in session:
         return redirect(url_for("login"))
 
-    usuario = db_session.query(Usuario).filter_by(id=session["usuario_id"]).first()
-    
+    usuario_id = session["usuario_id"]
+    if carregar_perfil(usuario_id) is None:  # conta excluída (veja purga.py)
+        session.clear()
+        return redirect(url_for("login"))
+
+    usuario = db_session.query(Usuario).filter_by(id=usuario_id).first()
+    if usuario.twofa_ativo:
+        erro = _erro_confirmacao(usuario, "O 2FA continua ativado.")
+        if erro is not None:
+            return erro
+
     # Lógica de toggle: Se 1, vira 0. Se 0, vira 1.
-    usuario.twofa_ativo = 1 - usuario.twofa_ativo 
-    
+    # O UPDATE só vale se o valor ainda for o conferido acima.
+    db_session.query(Usuario).filter_by(id=usuario_id, twofa_ativo=usuario.twofa_ativo).update(
+        {Usuario.twofa_ativo: 1 - Usuario.twofa_ativo}, synchronize_session=False
+    )
     db_session.commit()
 
+    # O perfil em cache ficou desatualizado
+    invalidar_perfil(usuario_id)
+    auditar(auditoria.TWOFA_ALTERADO, usuario_id, ip=ip_cliente())
+
     flash("✅ Autenticação em duas etapas atualizada com sucesso!", "sucesso")
     
     # Redireciona de volta para a página de configurações.
     return redirect(url_for("configuracoes"))
 
 
+def _erro_confirmacao(usuario, mantido):
+    """
+    Resposta de erro se a senha/código do campo "confirmacao" não conferir
+    (veja autenticacao.confirmar_identidade), ou None se conferiu.
+    """
+    try:
+        confirmado = confirmar_identidade(db_session, usuario, request.form.get("confirmacao", ""))
+    except FilaHashCheia:
+        flash("Servidor ocupado no momento. Tente novamente em alguns segundos.", "erro")
+        return redirect(url_for("configuracoes"))
+    if not confirmado:
+        db_session.rollback()
+        flash(f"Senha ou código incorretos. {mantido}", "erro")
+        return redirect(url_for("configuracoes"))
+    return None
+
+
+# ---------------- APLICATIVO AUTENTICADOR (TOTP) -----------------
+@app.route("/totp/iniciar", methods=["POST"])
+def totp_iniciar():
+    """
+    Começa o cadastro do aplicativo: gera um segredo e guarda na sessão
+    até o usuário confirmar com um código (só então vai para o banco).
+    Com um aplicativo já cadastrado, é preciso removê-lo antes (o que pede
+    a senha ou o código atual): trocar de aplicativo não pode ser um atalho
+    para passar por cima dessa confirmação.
+    """
+    if "usuario_id" not in session:
+        return redirect(url_for("login"))
+    usuario = carregar_perfil(session["usuario_id"])
+    if usuario is None:  # conta excluída (veja purga.py)
+        session.clear()
+        return redirect(url_for("login"))
+    if usuario.totp_ativo:
+        flash("Já existe um aplicativo cadastrado. Remova-o antes de cadastrar outro.", "erro")
+        return redirect(url_for("configuracoes"))
+
+    session["totp_pendente"] = totp.gerar_segredo()
+    return redirect(url_for("configuracoes"))
+
+
+@app.route("/totp/confirmar", methods=["POST"])
+def totp_confirmar():
+    """
+    Confirma o cadastro com o primeiro código do aplicativo.
+    Grava o segredo, marca o código como usado e liga o 2FA. Só grava se a
+    conta ainda não tiver aplicativo (veja totp_iniciar).
+    """
+    if "usuario_id" not in session:
+        return redirect(url_for("login"))
+
+    usuario_id = session["usuario_id"]
+    if carregar_perfil(usuario_id) is None:  # conta excluída (veja purga.py)
+        session.clear()
+        return redirect(url_for("login"))
+
+    segredo = session.get("totp_pendente")
+    if not segredo:
+        return redirect(url_for("configuracoes"))
+
+    passo = totp.verificar(segredo, request.form.get("codigo"))
+    if passo is None:
+        flash("Código incorreto. Confira se o relógio do celular está certo e tente de novo.", "erro")
+        return redirect(url_for("configuracoes"))
+
+    # UPDATE condicional: nunca troca um segredo já cadastrado
+    gravados = db_session.query(Usuario).filter(
+        Usuario.id == usuario_id, Usuario.totp_segredo.is_(None)
+    ).update(
+        {Usuario.totp_segredo: segredo, Usuario.totp_ultimo_passo: passo, Usuario.twofa_ativo: 1},
+        synchronize_session=False,
+    )
+    db_session.commit()
+    invalidar_perfil(usuario_id)
+    session.pop("totp_pendente")
+    if not gravados:
+        flash("Já existe um aplicativo cadastrado. Remova-o antes de cadastrar outro.", "erro")
+        return redirect(url_for("configuracoes"))
+    auditar(auditoria.TOTP_ATIVADO, usuario_id, ip=ip_cliente())
+
+    flash("✅ Aplicativo autenticador ativado! Os próximos logins pedirão o código dele.", "sucesso")
+    return redirect(url_for("configuracoes"))
+
+
+@app.route("/totp/desativar", methods=["POST"])
+def totp_desativar():
+    """
+    Remove o aplicativo (ou cancela um cadastro em andamento).
+    O 2FA, se ligado, volta a ser pelo código enviado por e-mail.
+    Remover pede a senha ou o código do aplicativo (campo "confirmacao").
+    """
+    if "usuario_id" not in session:
+        return redirect(url_for("login"))
+
+    usuario_id = session["usuario_id"]
+    if carregar_perfil(usuario_id) is None:  # conta excluída (veja purga.py)
+        session.clear()
+        return redirect(url_for("login"))
+
+    if session.pop("totp_pendente", None):
+        return redirect(url_for("configuracoes"))
+
+    usuario = db_session.query(Usuario).filter_by(id=usuario_id).first()
+    erro = _erro_confirmacao(usuario, "O aplicativo continua cadastrado.")
+    if erro is not None:
+        return erro
+
+    db_session.query(Usuario).filter_by(id=usuario_id).update(
+        {Usuario.totp_segredo: None, Usuario.totp_ultimo_passo: None}, synchronize_session=False
+    )
+    db_session.commit()
+    invalidar_perfil(usuario_id)
+    auditar(auditoria.TOTP_REMOVIDO, usuario_id, ip=ip_cliente())
+
+    flash("Aplicativo autenticador removido. O código 2FA voltará a ser enviado por e-mail.", "sucesso")
+    return redirect(url_for("configuracoes"))
+
+
 # ---------------- EXCLUIR CONTA -----------------
 @app.route("/excluir_conta", methods=["POST"])
 def excluir_conta():
     """
-    Exclui permanentemente a conta do usuário do banco de dados.
-    Requer confirmação de senha.
+    Exclui a conta do usuário. Requer confirmação de senha.
+    - Na hora: marca a conta como excluída (o login e as páginas passam a
+      tratá-la como inexistente) e encerra a sessão.
+    - Em segundo plano: sessões, tickets, histórico e por fim a linha do
+      usuário são apagados em lotes (veja purga.py), sem segurar a requisição.
     """
     # 1. Verifica se o usuário está logado
     if "usuario_id" not in session:
@@ -369,18 +528,29 @@ def excluir_conta():
     senha_confirmacao = request.form["senha_confirmacao"]
     usuario_id = session["usuario_id"]
     
-    usuario = db_session.query(Usuario).filter_by(id=usuario_id).first()
+    usuario = db_session.query(Usuario).filter_by(id=usuario_id, excluido_em=None).first()
 
     # 3. Verifica se a senha está correta
-    if not usuario or not bcrypt.checkpw(senha_confirmacao.encode('utf-8'), usuario.hash_senha.encode('utf-8')):
+    try:
+        senha_ok = usuario is not None and verificar_senha(senha_confirmacao, usuario.hash_senha)
+    except FilaHashCheia:
+        flash("Servidor ocupado no momento. Tente novamente em alguns segundos.", "erro")
+        return redirect(url_for("configuracoes"))
+
+    if not senha_ok:
         # Se a senha estiver errada, avisa e manda de volta para as configurações
+        auditar(auditoria.EXCLUSAO_FALHA, usuario_id, ip=ip_cliente(), motivo="senha")
         flash("Senha incorreta. A conta não foi excluída.", "erro")
         return redirect(url_for("configuracoes"))
 
-    # 4. Se a senha estiver correta, exclui o usuário
+    # 4. Se a senha estiver correta, marca a conta como excluída e agenda a purga
+    email = usuario.email
     try:
-        db_session.delete(usuario)
+        marcar_exclusao(db_session, usuario_id)
         db_session.commit()
+        purgador.acordar()
+        invalidar_perfil(usuario_id)
+        auditar(auditoria.CONTA_EXCLUIDA, usuario_id, email, ip_cliente())
         
         # 5. Limpa a sessão (logout) e manda para a página de login
         session.clear()
@@ -389,7 +559,7 @@ def excluir_conta():
         
     except Exception as e:
         db_session.rollback()
-        print(f"Erro ao excluir usuário: {e}")
+        auditar(auditoria.EXCLUSAO_FALHA, usuario_id, ip=ip_cliente(), erro=repr(e))
         flash("Ocorreu um erro ao tentar excluir sua conta. Tente novamente.", "erro")
         return redirect(url_for("configuracoes"))
 
@@ -404,6 +574,34 @@ def logout():
     return redirect(url_for("login"))
 
 
+# ---------------- MÉTRICAS -----------------
+# Valores atuais dos componentes (executor de hash, filas de e-mails e de auditoria, caches)
+FONTES_METRICAS = {
+    "hash": executor_hash.metricas,
+    "email": fila_email.metricas,
+    "cache_usuarios": cache_usuarios.metricas,
+    "fragmentos": cache_fragmentos.metricas,
+    "paginas": cache_paginas.metricas,
+    "auditoria": registro_auditoria.metricas,
+    "purga": purgador.metricas,
+}
+
+# Como o /metrics, só existe com METRICAS_ATIVAS=1: expõe dados internos
+# e não pede login (restrinja o acesso no proxy)
+if instrumentacao.METRICAS_ATIVAS:
+    @app.route("/metricas")
+    def metricas():
+        """
+        Métricas internas em JSON.
+        """
+        return jsonify({grupo: funcao() for grupo, funcao in FONTES_METRICAS.items()})
+
+
+# Server-Timing + /metrics (Prometheus) quando METRICAS_ATIVAS=1
+instrumentacao.init_app(app, fontes=FONTES_METRICAS)
+
+
 # ---------------- EXECUÇÃO -----------------
+# Servidor de desenvolvimento. Em produção: flask --app main serve
 if __name__ == "__main__":
     app.run(debug=True)
\ No newline at end of file
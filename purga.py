@@ -0,0 +1,281 @@
+"""
+Exclusão de conta em duas fases.
+
+Antes, excluir_conta() apagava o usuário (e, em cascata, tudo dele) dentro
+da requisição: com muitos tickets, a exclusão demorava e segurava locks.
+Agora:
+1. Na requisição, marcar_exclusao() só preenche usuarios.excluido_em e cria
+   a tarefa em 'tarefas_purga', no mesmo COMMIT. A partir daí o login e as
+   páginas tratam a conta como inexistente. Tempo constante, seja qual
+   for o tamanho da conta.
+2. Em segundo plano, o Purgador apaga os dados em lotes de PURGA_LOTE
+   linhas, um COMMIT por lote (locks curtos), nesta ordem:
+   sessões abertas em outros aparelhos (SESSAO_BACKEND=sql; no cookie não
+   há o que apagar) → tickets → eventos de auditoria anteriores à
+   exclusão (depois de esperar a fila do registro_auditoria gravar os que
+   ainda estavam em memória) → a linha do usuário. Cada lote grava a etapa e o total removido na tarefa, então
+   depois de uma queda o trabalho continua de onde parou.
+
+Vários processos podem rodar o Purgador: cada tarefa é "travada" por
+PURGA_TRAVA segundos com um UPDATE condicional, renovado a cada lote. Se o
+processo morrer, a trava vence e outro assume. Tarefas com erro são
+retentadas quando a trava vence.
+
+`flask --app main purgar-contas` roda as pendentes na hora (ou --listar).
+"""
+from datetime import datetime, timedelta
+from sqlalchemy import select, update, delete, or_
+from database import Usuario, Ticket, TicketContagem, TarefaPurga, EventoAuditoria, Sessao, obter_engine
+from auditoria import registro_auditoria, AUDITORIA_INTERVALO
+from dotenv import load_dotenv
+import threading
+import socket
+import click
+import time
+import os
+
+load_dotenv()
+
+PURGA_LOTE = int(os.getenv("PURGA_LOTE", 500))              # linhas por DELETE
+PURGA_PAUSA = float(os.getenv("PURGA_PAUSA", 0.05))         # segundos entre lotes
+PURGA_INTERVALO = float(os.getenv("PURGA_INTERVALO", 30))   # procura tarefas de outros processos
+PURGA_TRAVA = float(os.getenv("PURGA_TRAVA", 60))           # segundos
+# Espera mínima entre a exclusão e a etapa "auditoria": cobre os eventos
+# ainda na fila do registro_auditoria dos outros processos
+PURGA_ESPERA_AUDITORIA = float(os.getenv("PURGA_ESPERA_AUDITORIA", 2 * AUDITORIA_INTERVALO))
+
+ETAPAS = ("sessoes", "tickets", "auditoria", "usuario", "concluida")
+
+
+def marcar_exclusao(db_session, usuario_id):
+    """
+    Fase 1 (na requisição): marca a conta como excluída e agenda a purga.
+    Não faz commit; retorna False se a conta já estava excluída.
+    """
+    agora = datetime.now()
+    alterados = (
+        db_session.query(Usuario)
+        .filter(Usuario.id == usuario_id, Usuario.excluido_em.is_(None))
+        .update({Usuario.excluido_em: agora}, synchronize_session=False)
+    )
+    if alterados:
+        # O SQLite reaproveita o id de um usuário já purgado: a tarefa
+        # concluída dele daria conflito de chave primária com a nova
+        db_session.query(TarefaPurga).filter(
+            TarefaPurga.usuario_id == usuario_id, TarefaPurga.etapa == "concluida"
+        ).delete(synchronize_session=False)
+        db_session.add(TarefaPurga(usuario_id=usuario_id, etapa=ETAPAS[0], criada_em=agora, atualizada_em=agora))
+    return bool(alterados)
+
+
+class Purgador:
+    """Executa as tarefas de 'tarefas_purga' em lotes, numa thread por processo."""
+
+    def __init__(self, lote=PURGA_LOTE, pausa=PURGA_PAUSA, intervalo=PURGA_INTERVALO, trava=PURGA_TRAVA,
+                 espera_auditoria=PURGA_ESPERA_AUDITORIA):
+        self.lote = lote
+        self.pausa = pausa
+        self.intervalo = intervalo
+        self.trava = trava
+        self.espera_auditoria = espera_auditoria
+        self._evento = threading.Event()
+        self._lock = threading.Lock()
+        self._pid = None
+
+        # --- Métricas ---
+        self._lotes = 0
+        self._removidos = 0
+        self._concluidas = 0
+        self._falhas = 0
+
+    @property
+    def dono(self):
+        return f"{socket.gethostname()}:{os.getpid()}"
+
+    # ---------------- API PÚBLICA -----------------
+    def iniciar(self):
+        """Sobe a thread do processo atual (de novo após fork)."""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+        threading.Thread(target=self._loop, name="purga", daemon=True).start()
+
+    def acordar(self):
+        """Avisa que há tarefa nova (sem esperar o próximo PURGA_INTERVALO)."""
+        self.iniciar()
+        self._evento.set()
+
+    def executar_pendentes(self):
+        """Processa todas as tarefas livres até o fim. Retorna quantas concluiu."""
+        concluidas = 0
+        while True:
+            usuario_id = self._pegar_tarefa()
+            if usuario_id is None:
+                return concluidas
+            try:
+                while self._passo(usuario_id):
+                    time.sleep(self.pausa)
+                concluidas += 1
+            except Exception as e:
+                # A trava continua até vencer: a tarefa é retentada depois
+                self._registrar_erro(usuario_id, e)
+
+    def metricas(self):
+        with self._lock:
+            return {
+                "lotes": self._lotes,
+                "removidos": self._removidos,
+                "concluidas": self._concluidas,
+                "falhas": self._falhas,
+            }
+
+    # ---------------- EXECUÇÃO -----------------
+    def _loop(self):
+        while True:
+            try:
+                self.executar_pendentes()
+            except Exception as e:
+                print("⚠️ Falha ao procurar tarefas de purga:", e)
+            self._evento.wait(self.intervalo)
+            self._evento.clear()
+
+    def _pegar_tarefa(self):
+        """Trava a próxima tarefa livre (mais antiga primeiro). None se não houver."""
+        agora = datetime.now()
+        livre = or_(TarefaPurga.trava_ate.is_(None), TarefaPurga.trava_ate < agora)
+        with obter_engine().begin() as conn:
+            candidatas = conn.execute(
+                select(TarefaPurga.usuario_id)
+                .where(TarefaPurga.etapa != "concluida", livre)
+                .order_by(TarefaPurga.criada_em)
+                .limit(10)
+            ).scalars().all()
+            for usuario_id in candidatas:
+                # UPDATE condicional: só um processo consegue a mesma tarefa
+                travou = conn.execute(
+                    update(TarefaPurga)
+                    .where(TarefaPurga.usuario_id == usuario_id, livre)
+                    .values(dono=self.dono, trava_ate=agora + timedelta(seconds=self.trava))
+                ).rowcount
+                if travou:
+                    return usuario_id
+        return None
+
+    def _passo(self, usuario_id):
+        """Apaga um lote da etapa atual. Retorna True enquanto houver trabalho."""
+        with obter_engine().begin() as conn:
+            tarefa = conn.execute(
+                select(TarefaPurga.etapa, TarefaPurga.criada_em)
+                .where(TarefaPurga.usuario_id == usuario_id, TarefaPurga.dono == self.dono)
+            ).first()
+            if tarefa is None or tarefa.etapa == "concluida":
+                return False  # perdemos a trava (outro processo assumiu) ou já acabou
+
+            etapa, removidos = tarefa.etapa, 0
+            if etapa == "sessoes":
+                removidos = self._apagar_lote(conn, Sessao, Sessao.usuario_id == usuario_id)
+            elif etapa == "tickets":
+                removidos = self._apagar_lote(conn, Ticket, Ticket.usuario_id == usuario_id)
+            elif etapa == "auditoria":
+                # O evento da própria exclusão (gravado depois) fica como registro
+                removidos = self._apagar_lote(
+                    conn, EventoAuditoria,
+                    EventoAuditoria.usuario_id == usuario_id, EventoAuditoria.criado_em < tarefa.criada_em,
+                )
+            elif etapa == "usuario":
+                conn.execute(delete(TicketContagem).where(TicketContagem.usuario_id == usuario_id))
+                conn.execute(delete(Usuario).where(Usuario.id == usuario_id, Usuario.excluido_em.isnot(None)))
+
+            if not removidos:
+                etapa = ETAPAS[ETAPAS.index(etapa) + 1]  # etapa vazia: passa para a próxima
+            agora = datetime.now()
+            conn.execute(
+                update(TarefaPurga)
+                .where(TarefaPurga.usuario_id == usuario_id)
+                .values(
+                    etapa=etapa,
+                    removidos=TarefaPurga.removidos + removidos,
+                    atualizada_em=agora,
+                    trava_ate=None if etapa == "concluida" else agora + timedelta(seconds=self.trava),
+                    erro=None,
+                )
+            )
+
+        with self._lock:
+            self._lotes += 1
+            self._removidos += removidos
+            if etapa == "concluida":
+                self._concluidas += 1
+        if etapa == "auditoria" and tarefa.etapa != "auditoria":
+            self._aguardar_auditoria(tarefa.criada_em)
+        return etapa != "concluida"
+
+    def _aguardar_auditoria(self, criada_em):
+        """
+        Eventos registrados antes da exclusão podem estar ainda na fila em
+        memória do registro_auditoria e chegar ao banco depois da etapa,
+        escapando do filtro por criado_em. Esvazia a fila deste processo e
+        espera `espera_auditoria` segundos desde a exclusão (filas dos outros).
+        """
+        registro_auditoria.esvaziar(timeout=max(self.espera_auditoria, 1))
+        restante = (criada_em + timedelta(seconds=self.espera_auditoria) - datetime.now()).total_seconds()
+        if restante > 0:
+            time.sleep(restante)
+
+    def _apagar_lote(self, conn, modelo, *filtros):
+        """Apaga até `lote` linhas (busca os ids antes: o MySQL não aceita LIMIT no IN)."""
+        ids = conn.execute(select(modelo.id).where(*filtros).limit(self.lote)).scalars().all()
+        if ids:
+            conn.execute(delete(modelo).where(modelo.id.in_(ids)))
+        return len(ids)
+
+    def _registrar_erro(self, usuario_id, erro):
+        print(f"⚠️ Falha na purga do usuário {usuario_id}:", erro)
+        with self._lock:
+            self._falhas += 1
+        try:
+            with obter_engine().begin() as conn:
+                conn.execute(
+                    update(TarefaPurga).where(TarefaPurga.usuario_id == usuario_id).values(erro=repr(erro))
+                )
+        except Exception:
+            pass  # o banco pode ser a causa; a trava vence de qualquer jeito
+
+
+# --- Instância única do processo ---
+purgador = Purgador()
+
+
+def listar_tarefas(pendentes=True):
+    """Tarefas de purga (só as não concluídas, por padrão), mais antigas primeiro."""
+    consulta = select(TarefaPurga.__table__).order_by(TarefaPurga.criada_em)
+    if pendentes:
+        consulta = consulta.where(TarefaPurga.etapa != "concluida")
+    with obter_engine().connect() as conn:
+        return [dict(linha) for linha in conn.execute(consulta).mappings()]
+
+
+def init_purga(app):
+    """
+    Liga a purga ao app:
+    - a thread sobe na primeira requisição de cada worker e retoma as
+      tarefas que ficaram pela metade;
+    - comando `flask purgar-contas`.
+    """
+    @app.before_request
+    def iniciar_purga():
+        purgador.iniciar()
+
+    @app.cli.command("purgar-contas")
+    @click.option("--listar", is_flag=True, help="Só mostra as tarefas pendentes.")
+    def comando_purgar_contas(listar):
+        """Conclui agora as exclusões de conta pendentes."""
+        if not listar:
+            concluidas = purgador.executar_pendentes()
+            print(f"✅ {concluidas} contas purgadas ({purgador.metricas()['removidos']} linhas).")
+        for tarefa in listar_tarefas():
+            print(f"usuario={tarefa['usuario_id']} etapa={tarefa['etapa']} removidos={tarefa['removidos']} "
+                  f"desde={tarefa['criada_em']:%Y-%m-%d %H:%M:%S} erro={tarefa['erro'] or '-'}")
@@ -0,0 +1,107 @@
+"""
+Servidor de produção: `flask --app main serve`.
+
+O app.run() do main.py é o servidor de desenvolvimento: um processo só, em
+modo debug. Aqui o app roda no gunicorn (Linux/macOS):
+- N processos (SERVIDOR_WORKERS), cada um com M threads (SERVIDOR_THREADS);
+- o app é carregado uma vez no processo mestre antes do fork (preload):
+  workers sobem rápido e dividem a memória do código. Após o fork, cada
+  worker descarta a engine herdada (database.descartar_engine()) e abre
+  as próprias conexões;
+- cada worker é reciclado depois de SERVIDOR_MAX_REQUISICOES requisições
+  (mais até 10% aleatórios, para não reiniciarem todos juntos), o que
+  limita vazamentos de memória;
+- sinais do gunicorn:
+    HUP  → sobe workers novos e encerra os velhos sem derrubar conexões.
+           Não carrega código novo: o `flask serve` já importou o main no
+           mestre, e os workers novos herdam esse mesmo código;
+    USR2 → sobe um mestre novo, que importa o código novo; depois mande
+           TERM ao mestre antigo. É o único jeito de trocar de versão sem
+           tempo fora do ar.
+- com --asgi, usa workers do uvicorn e serve o asgi.py (login e 2FA
+  assíncronos).
+"""
+from database import descartar_engine
+from hashing import custo_bcrypt
+from dotenv import load_dotenv
+import importlib.util
+import click
+import os
+
+load_dotenv()
+
+SERVIDOR_BIND = os.getenv("SERVIDOR_BIND", "0.0.0.0:8000")
+SERVIDOR_WORKERS = int(os.getenv("SERVIDOR_WORKERS", (os.cpu_count() or 1) * 2 + 1))
+SERVIDOR_THREADS = int(os.getenv("SERVIDOR_THREADS", 4))
+SERVIDOR_MAX_REQUISICOES = int(os.getenv("SERVIDOR_MAX_REQUISICOES", 2000))
+SERVIDOR_TIMEOUT = int(os.getenv("SERVIDOR_TIMEOUT", 30))  # segundos
+SERVIDOR_PRELOAD = os.getenv("SERVIDOR_PRELOAD", "1").lower() in ("1", "true", "sim")
+
+
+def _depois_do_fork(servidor, worker):
+    """Hook post_fork do gunicorn: o worker não usa as conexões do mestre."""
+    descartar_engine()
+
+
+def _classe_worker(threads, asgi):
+    if asgi:
+        # O pacote uvicorn-worker substitui o uvicorn.workers (descontinuado)
+        if importlib.util.find_spec("uvicorn_worker"):
+            return "uvicorn_worker.UvicornWorker"
+        return "uvicorn.workers.UvicornWorker"
+    return "gthread" if threads > 1 else "sync"
+
+
+def criar_servidor(app, asgi=False, **opcoes):
+    """Monta a aplicação do gunicorn com as opções dadas (nomes do gunicorn)."""
+    from gunicorn.app.base import BaseApplication
+
+    class ServidorGunicorn(BaseApplication):
+        def load_config(self):
+            for nome, valor in opcoes.items():
+                if valor is not None and nome in self.cfg.settings:
+                    self.cfg.set(nome, valor)
+            self.cfg.set("post_fork", _depois_do_fork)
+
+        def load(self):
+            if asgi:
+                import asgi as modulo_asgi
+                return modulo_asgi.app
+            return app
+
+    return ServidorGunicorn()
+
+
+def registrar_servidor(app):
+    """Registra o comando `flask serve`."""
+
+    @app.cli.command("serve")
+    @click.option("--bind", default=SERVIDOR_BIND, show_default=True, help="Endereço:porta.")
+    @click.option("--workers", default=SERVIDOR_WORKERS, show_default=True, help="Processos.")
+    @click.option("--threads", default=SERVIDOR_THREADS, show_default=True, help="Threads por processo.")
+    @click.option("--max-requisicoes", default=SERVIDOR_MAX_REQUISICOES, show_default=True,
+                  help="Recicla o worker depois de N requisições (0 = nunca).")
+    @click.option("--preload/--no-preload", default=SERVIDOR_PRELOAD, show_default=True,
+                  help="Carrega o app antes do fork.")
+    @click.option("--asgi", is_flag=True, help="Usa workers do uvicorn e o asgi.py.")
+    def comando_serve(bind, workers, threads, max_requisicoes, preload, asgi):
+        """Sobe o app no gunicorn (processos + threads, reciclagem, reload por sinal)."""
+        if importlib.util.find_spec("gunicorn") is None:
+            raise click.ClickException("Instale o gunicorn: pip install gunicorn (Linux/macOS).")
+        # Calibra o bcrypt aqui, no mestre: os workers herdam o custo
+        custo_bcrypt()
+        print(f"🚀 {workers} workers × {threads} threads em {bind} "
+              f"({'ASGI' if asgi else 'WSGI'}, preload {'ligado' if preload else 'desligado'})")
+        criar_servidor(
+            app,
+            asgi=asgi,
+            bind=bind,
+            workers=workers,
+            threads=threads,
+            worker_class=_classe_worker(threads, asgi),
+            max_requests=max_requisicoes,
+            max_requests_jitter=max_requisicoes // 10,  # até +10%: os workers não reciclam todos juntos
+            timeout=SERVIDOR_TIMEOUT,
+            graceful_timeout=SERVIDOR_TIMEOUT,
+            preload_app=preload,
+        ).run()
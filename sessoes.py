@@ -0,0 +1,253 @@
+"""
+Onde ficam as sessões de login (variável SESSAO_BACKEND no .env).
+
+Antes o app gravava um arquivo por sessão na pasta flask_session/. A pasta
+crescia sem parar, precisava ser varrida para limpar e não era vista por
+outro servidor. Agora há duas opções:
+- "cookie" (padrão): o conteúdo vai no próprio cookie, assinado com a
+  SECRET_KEY (e comprimido quando compensa). Nenhum acesso a disco ou banco.
+- "sql": o cookie leva só um identificador aleatório; os dados ficam na
+  tabela 'sessoes' do banco do app, compartilhada entre workers e
+  servidores. A expiração é indexada e as vencidas são apagadas de tempos
+  em tempos (SESSAO_LIMPEZA) com um único DELETE.
+
+No backend "sql":
+- o banco guarda o SHA-256 do identificador, nunca o valor do cookie;
+- o identificador muda quando o usuário logado muda (evita fixação de sessão);
+- uma requisição que não alterou a sessão só regrava a validade se ela
+  andou mais de SESSAO_RENOVAR segundos (ou de 1/4 da validade da sessão,
+  se for menor);
+- a sessão de antes do login (e-mail à espera do código do 2FA) não é
+  permanente: no banco ela vale SESSAO_TEMPORARIA_MINUTOS, não os
+  SESSAO_MINUTOS do app, para não vencer antes do código.
+"""
+from datetime import datetime, timedelta, timezone
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin, SecureCookieSessionInterface
+from sqlalchemy import select, delete, update, insert
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from werkzeug.datastructures import CallbackDict
+from database import Sessao, obter_engine
+from dotenv import load_dotenv
+import threading
+import hashlib
+import secrets
+import time
+import os
+
+load_dotenv()
+
+SESSAO_BACKEND = os.getenv("SESSAO_BACKEND", "cookie")
+SESSAO_LIMPEZA = float(os.getenv("SESSAO_LIMPEZA", 300))  # segundos entre as limpezas
+SESSAO_RENOVAR = float(os.getenv("SESSAO_RENOVAR", 60))   # segundos
+# Sessões não permanentes (pré-login). Não deve ser menor que o
+# CODIGO_EXPIRA_MINUTOS (autenticacao.py), o tempo do código do 2FA.
+SESSAO_TEMPORARIA_MINUTOS = float(os.getenv("SESSAO_TEMPORARIA_MINUTOS", 10))
+
+
+def _agora():
+    """Hora atual em UTC, sem fuso (como fica gravada na coluna DateTime)."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _chave(sid):
+    return hashlib.sha256(sid.encode("utf-8")).hexdigest()
+
+
+# ==========================
+# 🗄️ BACKEND SQL
+# ==========================
+class SessaoServidor(CallbackDict, SessionMixin):
+    """Dict da sessão que marca `modified` a cada alteração."""
+
+    def __init__(self, dados=None, sid=None, expira_em=None):
+        def ao_alterar(sessao):
+            sessao.modified = True
+
+        super().__init__(dados, ao_alterar)
+        self.sid = sid
+        self.expira_em = expira_em  # validade gravada no banco (None = nova)
+        self.usuario_inicial = self.get("usuario_id")
+        self.modified = False
+
+
+class SessaoSQLInterface(SessionInterface):
+    """Sessões na tabela 'sessoes' (uma linha por sessão)."""
+
+    serializer = TaggedJSONSerializer()  # o mesmo formato do cookie do Flask
+    tabela = Sessao.__table__
+
+    def __init__(self, intervalo_limpeza=SESSAO_LIMPEZA, renovar=SESSAO_RENOVAR,
+                 validade_temporaria=SESSAO_TEMPORARIA_MINUTOS):
+        self.intervalo_limpeza = intervalo_limpeza
+        self.renovar = timedelta(seconds=renovar)
+        self.validade_temporaria = timedelta(minutes=validade_temporaria)
+        self._lock = threading.Lock()
+        self._pid = None
+
+        # --- Métricas ---
+        self._leituras = 0
+        self._gravacoes = 0
+        self._gravacoes_evitadas = 0
+        self._removidas = 0
+
+    # --- Leitura ---
+    def open_session(self, app, request):
+        self._iniciar_limpeza()
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if not sid or len(sid) > 64:
+            return SessaoServidor()
+
+        with obter_engine().connect() as conn:
+            linha = conn.execute(
+                select(self.tabela.c.dados, self.tabela.c.expira_em)
+                .where(self.tabela.c.id == _chave(sid), self.tabela.c.expira_em > _agora())
+            ).first()
+        with self._lock:
+            self._leituras += 1
+        if linha is None:
+            return SessaoServidor()
+        try:
+            dados = self.serializer.loads(linha.dados)
+        except ValueError:
+            return SessaoServidor()
+        return SessaoServidor(dados, sid, linha.expira_em)
+
+    # --- Gravação ---
+    def save_session(self, app, session, response):
+        nome = self.get_cookie_name(app)
+        dominio = self.get_cookie_domain(app)
+        caminho = self.get_cookie_path(app)
+
+        # Sessão esvaziada (logout): apaga a linha e o cookie
+        if not session:
+            if session.sid and session.modified:
+                self._apagar(session.sid)
+                response.delete_cookie(nome, domain=dominio, path=caminho)
+                response.vary.add("Cookie")
+            return
+
+        if not self.should_set_cookie(app, session):
+            return
+
+        expira_cookie = self.get_expiration_time(app, session)  # None = até fechar o navegador
+        validade = app.permanent_session_lifetime if session.permanent else self.validade_temporaria
+        expira_em = (
+            expira_cookie.astimezone(timezone.utc).replace(tzinfo=None)
+            if expira_cookie else _agora() + validade
+        )
+
+        # Nada mudou e a validade quase não andou: evita um UPDATE por requisição.
+        # Com sessões curtas (SESSAO_MINUTOS=1), renova a cada 1/4 da validade
+        # no máximo, senão a sessão venceria com o usuário ativo.
+        renovar = min(self.renovar, validade / 4)
+        if not session.modified and session.expira_em and expira_em - session.expira_em < renovar:
+            with self._lock:
+                self._gravacoes_evitadas += 1
+            return
+
+        # Entrou (ou trocou) de usuário: gera um identificador novo
+        if session.sid and session.get("usuario_id") != session.usuario_inicial:
+            self._apagar(session.sid)
+            session.sid = None
+        if session.sid is None:
+            session.sid = secrets.token_urlsafe(32)
+
+        self._gravar(_chave(session.sid), self.serializer.dumps(dict(session)), expira_em, session.get("usuario_id"))
+        response.set_cookie(
+            nome,
+            session.sid,
+            expires=expira_cookie,
+            httponly=self.get_cookie_httponly(app),
+            domain=dominio,
+            path=caminho,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+        )
+        response.vary.add("Cookie")
+
+    def _gravar(self, chave, dados, expira_em, usuario_id):
+        """INSERT ou UPDATE da linha, num único comando quando o banco permite."""
+        valores = {"id": chave, "dados": dados, "expira_em": expira_em, "usuario_id": usuario_id}
+        with obter_engine().begin() as conn:
+            dialeto = conn.dialect.name
+            if dialeto == "mysql":
+                stmt = mysql_insert(self.tabela).values(**valores)
+                conn.execute(stmt.on_duplicate_key_update(
+                    dados=stmt.inserted.dados, expira_em=stmt.inserted.expira_em, usuario_id=stmt.inserted.usuario_id,
+                ))
+            elif dialeto == "sqlite":
+                stmt = sqlite_insert(self.tabela).values(**valores)
+                conn.execute(stmt.on_conflict_do_update(
+                    index_elements=["id"],
+                    set_={"dados": stmt.excluded.dados, "expira_em": stmt.excluded.expira_em,
+                          "usuario_id": stmt.excluded.usuario_id},
+                ))
+            else:
+                resultado = conn.execute(
+                    update(self.tabela).where(self.tabela.c.id == chave)
+                    .values(dados=dados, expira_em=expira_em, usuario_id=usuario_id)
+                )
+                if resultado.rowcount == 0:
+                    conn.execute(insert(self.tabela).values(**valores))
+        with self._lock:
+            self._gravacoes += 1
+
+    def _apagar(self, sid):
+        with obter_engine().begin() as conn:
+            conn.execute(delete(self.tabela).where(self.tabela.c.id == _chave(sid)))
+
+    # --- Limpeza das vencidas ---
+    def limpar(self):
+        """Apaga todas as sessões vencidas. Retorna quantas foram removidas."""
+        with obter_engine().begin() as conn:
+            removidas = conn.execute(delete(self.tabela).where(self.tabela.c.expira_em <= _agora())).rowcount
+        with self._lock:
+            self._removidas += removidas
+        return removidas
+
+    def _iniciar_limpeza(self):
+        """Sobe a thread de limpeza no processo atual (de novo após fork)."""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+        t = threading.Thread(target=self._loop_limpeza, name="limpeza-sessoes", daemon=True)
+        t.start()
+
+    def _loop_limpeza(self):
+        while True:
+            time.sleep(self.intervalo_limpeza)
+            try:
+                self.limpar()
+            except Exception as e:
+                print("⚠️ Falha ao limpar sessões vencidas:", e)
+
+    def metricas(self):
+        with self._lock:
+            return {
+                "leituras": self._leituras,
+                "gravacoes": self._gravacoes,
+                "gravacoes_evitadas": self._gravacoes_evitadas,
+                "removidas": self._removidas,
+            }
+
+
+# ==========================
+# 🔧 ESCOLHA DO BACKEND
+# ==========================
+def criar_interface_sessao(backend=SESSAO_BACKEND):
+    """Interface de sessão para o backend escolhido ("cookie" ou "sql")."""
+    if backend == "sql":
+        return SessaoSQLInterface()
+    if backend == "cookie":
+        return SecureCookieSessionInterface()
+    raise ValueError(f"SESSAO_BACKEND desconhecido: {backend!r} (use 'cookie' ou 'sql')")
+
+
+def init_sessoes(app, backend=SESSAO_BACKEND):
+    """Liga o backend de sessão escolhido no app."""
+    app.session_interface = criar_interface_sessao(backend)
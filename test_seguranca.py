@@ -0,0 +1,165 @@
+"""
+Testes do 2FA por aplicativo e da purga de contas.
+
+Rode com: python -m pytest -q test_seguranca.py
+Usam um SQLite temporário (nada toca o banco do .env).
+"""
+import os
+import tempfile
+
+_pasta = tempfile.mkdtemp(prefix="helpdesk-testes-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_pasta, 'testes.db')}"
+os.environ["BCRYPT_CUSTO"] = "4"  # hashes rápidos
+os.environ["SESSAO_BACKEND"] = "cookie"
+
+import base64
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select, func, update
+
+import database
+import totp
+from database import Usuario, Ticket, TarefaPurga, obter_engine, session as db_session
+from hashing import _gerar
+from purga import Purgador, marcar_exclusao
+
+# Segredo dos vetores do RFC 6238 (apêndice B, HMAC-SHA1), em base32
+SEGREDO_RFC = base64.b32encode(b"12345678901234567890").decode()
+
+
+@pytest.fixture(autouse=True)
+def banco():
+    """Tabelas limpas a cada teste."""
+    from auditoria import registro_auditoria
+    registro_auditoria.esvaziar()  # eventos do teste anterior não vazam para este
+    database.Base.metadata.drop_all(obter_engine())
+    database.criar_tabelas()
+    yield
+    db_session.remove()
+
+
+def criar_usuario(email="ana@exemplo.com", senha="Senha@123", **campos):
+    usuario = Usuario(nome="Ana", email=email, hash_senha=_gerar(senha), **campos)
+    db_session.add(usuario)
+    db_session.commit()
+    return usuario.id
+
+
+# ---------------- TOTP -----------------
+@pytest.mark.parametrize("instante, esperado", [
+    (59, "94287082"),
+    (1111111109, "07081804"),
+    (1111111111, "14050471"),
+    (1234567890, "89005924"),
+    (2000000000, "69279037"),
+    (20000000000, "65353130"),
+])
+def test_vetores_rfc6238(instante, esperado):
+    # O RFC usa 8 dígitos; os 6 do app são os últimos 6 do mesmo valor
+    assert totp.codigo(SEGREDO_RFC, totp.passo_atual(instante)) == esperado[-totp.TOTP_DIGITOS:]
+
+
+def test_verificar_aceita_janela_e_recusa_passo_usado():
+    agora = 1234567890
+    passo = totp.passo_atual(agora)
+    assert totp.verificar(SEGREDO_RFC, totp.codigo(SEGREDO_RFC, passo - 1), agora=agora) == passo - 1
+    assert totp.verificar(SEGREDO_RFC, totp.codigo(SEGREDO_RFC, passo), ultimo_passo=passo, agora=agora) is None
+    assert totp.verificar(SEGREDO_RFC, "000000", agora=agora) is None
+
+
+def test_comando_uso_bloqueia_replay():
+    usuario_id = criar_usuario(totp_segredo=SEGREDO_RFC, twofa_ativo=1)
+    passo = totp.passo_atual()
+    with obter_engine().begin() as conn:
+        assert conn.execute(totp.comando_uso(usuario_id, passo)).rowcount == 1
+        assert conn.execute(totp.comando_uso(usuario_id, passo)).rowcount == 0      # mesmo código de novo
+        assert conn.execute(totp.comando_uso(usuario_id, passo - 1)).rowcount == 0  # código mais velho
+        assert conn.execute(totp.comando_uso(usuario_id, passo + 1)).rowcount == 1
+
+
+def test_remover_aplicativo_pede_senha_ou_codigo():
+    import main
+    segredo = totp.gerar_segredo()
+    usuario_id = criar_usuario(totp_segredo=segredo, twofa_ativo=1)
+    cliente = main.app.test_client()
+    with cliente.session_transaction() as sessao:
+        sessao["usuario_id"] = usuario_id
+
+    cliente.post("/totp/desativar", data={"confirmacao": "errada"})
+    assert db_session.get(Usuario, usuario_id).totp_segredo == segredo
+    db_session.remove()
+
+    cliente.post("/totp/desativar", data={"confirmacao": "Senha@123"})
+    assert db_session.get(Usuario, usuario_id).totp_segredo is None
+
+
+def test_nao_troca_aplicativo_cadastrado_sem_remover():
+    import main
+    segredo = totp.gerar_segredo()
+    usuario_id = criar_usuario(totp_segredo=segredo, twofa_ativo=1)
+    cliente = main.app.test_client()
+    with cliente.session_transaction() as sessao:
+        sessao["usuario_id"] = usuario_id
+        sessao["totp_pendente"] = outro = totp.gerar_segredo()  # cadastro iniciado por quem tem a sessão
+
+    cliente.post("/totp/iniciar")
+    with cliente.session_transaction() as sessao:
+        assert sessao["totp_pendente"] == outro  # não gera outro segredo
+    cliente.post("/totp/confirmar", data={"codigo": totp.codigo(outro, totp.passo_atual())})
+    assert db_session.get(Usuario, usuario_id).totp_segredo == segredo
+
+
+# ---------------- PURGA -----------------
+def test_purga_retoma_depois_de_queda():
+    usuario_id = criar_usuario()
+    with obter_engine().begin() as conn:
+        conn.execute(Ticket.__table__.insert(), [
+            {"usuario_id": usuario_id, "assunto": f"t{i}", "solicitante": "Ana", "status": "open",
+             "criado_em": datetime.now()}
+            for i in range(25)
+        ])
+    marcar_exclusao(db_session, usuario_id)
+    db_session.commit()
+
+    # Primeiro processo: trava a tarefa, apaga dois lotes e "cai"
+    primeiro = Purgador(lote=10, pausa=0)
+    assert primeiro._pegar_tarefa() == usuario_id
+    primeiro._passo(usuario_id)  # sessões (nenhuma): passa para os tickets
+    primeiro._passo(usuario_id)  # 10 tickets
+    segundo = Purgador(lote=10, pausa=0)
+    assert segundo.executar_pendentes() == 0  # a trava ainda vale
+
+    # A trava vence: outro processo continua de onde parou
+    with obter_engine().begin() as conn:
+        conn.execute(update(TarefaPurga).values(trava_ate=datetime.now() - timedelta(seconds=1)))
+    assert segundo.executar_pendentes() == 1
+
+    with obter_engine().connect() as conn:
+        assert conn.execute(select(func.count()).select_from(Ticket)).scalar() == 0
+        assert conn.execute(select(func.count()).select_from(Usuario)).scalar() == 0
+        tarefa = conn.execute(select(TarefaPurga.etapa, TarefaPurga.removidos)).one()
+    assert tarefa.etapa == "concluida"
+    assert tarefa.removidos == 25
+
+
+def test_purga_aceita_id_reaproveitado():
+    # O SQLite devolve o mesmo id a uma conta nova depois da purga da anterior
+    for email in ("ana@exemplo.com", "bia@exemplo.com"):
+        usuario_id = criar_usuario(email=email)
+        assert marcar_exclusao(db_session, usuario_id)
+        db_session.commit()
+        assert Purgador(pausa=0, espera_auditoria=0).executar_pendentes() == 1
+    with obter_engine().connect() as conn:
+        assert conn.execute(select(TarefaPurga.etapa)).scalars().all() == ["concluida"]
+
+
+def test_purga_apaga_auditoria_ainda_na_fila():
+    from auditoria import registro_auditoria, LOGIN_OK, EventoAuditoria
+    usuario_id = criar_usuario()
+    registro_auditoria.registrar(LOGIN_OK, usuario_id=usuario_id)  # ainda em memória
+    marcar_exclusao(db_session, usuario_id)
+    db_session.commit()
+    assert Purgador(pausa=0, espera_auditoria=0).executar_pendentes() == 1
+    with obter_engine().connect() as conn:
+        assert conn.execute(select(func.count()).select_from(EventoAuditoria)).scalar() == 0
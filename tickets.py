@@ -0,0 +1,202 @@
+"""
+Consultas de tickets usadas pelas rotas.
+
+A listagem usa paginação por cursor (keyset): em vez de OFFSET, cada
+página começa logo "depois" do último ticket da página anterior, pelo par
+(criado_em, id). Com o índice (usuario_id, criado_em, id) o banco vai
+direto ao ponto certo, então a página 1 e a página 500 custam o mesmo.
+
+Filtro por status e busca por palavras também rodam no banco:
+- status usa o índice (usuario_id, status, criado_em, id);
+- a busca usa o índice FULLTEXT no MySQL e a tabela FTS5 no SQLite.
+
+O painel (resumo_painel) traz usuário, contagem por status e os tickets
+mais recentes numa única consulta.
+"""
+from collections import namedtuple
+from sqlalchemy import and_, or_, text, select, func, case, true
+from sqlalchemy.orm import load_only
+from database import Usuario, Ticket, TicketContagem, STATUS_TICKET, contagens_automaticas, session as db_session
+from cache_usuario import PerfilUsuario, COLUNAS_PERFIL
+from datetime import datetime
+import re
+
+POR_PAGINA_PADRAO = 20
+POR_PAGINA_MAX = 100
+RECENTES_PAINEL = 5
+
+ResumoPainel = namedtuple("ResumoPainel", ["usuario", "contagens", "recentes"])
+
+
+def codificar_cursor(ticket):
+    """Transforma o último ticket da página em um cursor para a URL."""
+    return f"{ticket.criado_em.isoformat()}_{ticket.id}"
+
+
+def decodificar_cursor(cursor):
+    """Lê o cursor da URL. Retorna (criado_em, id) ou None se for inválido."""
+    if not cursor:
+        return None
+    try:
+        data, ticket_id = cursor.rsplit("_", 1)
+        return datetime.fromisoformat(data), int(ticket_id)
+    except ValueError:
+        return None
+
+
+def normalizar_por_pagina(valor):
+    """Garante um tamanho de página entre 1 e POR_PAGINA_MAX."""
+    if not valor or valor < 1:
+        return POR_PAGINA_PADRAO
+    return min(valor, POR_PAGINA_MAX)
+
+
+def normalizar_status(valor):
+    """Aceita só status conhecidos; qualquer outro valor ("all", vazio) vira None."""
+    return valor if valor in STATUS_TICKET else None
+
+
+def _termos(busca):
+    """Quebra a busca em palavras simples (sem operadores da sintaxe de busca)."""
+    return re.findall(r"\w+", busca or "")
+
+
+def _filtro_busca(busca):
+    """Monta a condição de busca textual de acordo com o banco em uso."""
+    termos = _termos(busca)
+    if not termos:
+        return None
+
+    dialeto = db_session.get_bind().dialect.name
+    if dialeto == "mysql":
+        # Modo booleano: todas as palavras obrigatórias, aceitando prefixo
+        consulta = " ".join(f"+{t}*" for t in termos)
+        return text("MATCH (tickets.assunto, tickets.descricao) AGAINST (:busca IN BOOLEAN MODE)").bindparams(busca=consulta)
+    if dialeto == "sqlite":
+        consulta = " ".join('"' + t.replace('"', '""') + '"*' for t in termos)
+        return Ticket.id.in_(
+            text("SELECT rowid FROM tickets_fts WHERE tickets_fts MATCH :busca").bindparams(busca=consulta)
+        )
+    # Outros bancos: LIKE simples (sem índice)
+    return and_(*[
+        or_(Ticket.assunto.ilike(f"%{t}%"), Ticket.descricao.ilike(f"%{t}%"))
+        for t in termos
+    ])
+
+
+def listar_tickets(usuario_id, por_pagina=POR_PAGINA_PADRAO, depois=None, status=None, busca=None):
+    """
+    Retorna uma página de tickets do usuário, do mais recente ao mais antigo.
+    - `depois`: cursor da página anterior (ou None para a primeira página).
+    - `status`: filtra por um status de STATUS_TICKET (None = todos).
+    - `busca`: palavras procuradas no assunto e na descrição.
+    - Retorna (tickets, proximo_cursor); proximo_cursor é None na última página.
+    """
+    # A lista só mostra estas colunas; a descrição vem sob demanda (buscar_ticket)
+    consulta = (
+        db_session.query(Ticket)
+        .options(load_only(Ticket.id, Ticket.assunto, Ticket.solicitante, Ticket.status, Ticket.criado_em))
+        .filter(Ticket.usuario_id == usuario_id)
+    )
+    if status:
+        consulta = consulta.filter(Ticket.status == status)
+    filtro = _filtro_busca(busca)
+    if filtro is not None:
+        consulta = consulta.filter(filtro)
+
+    posicao = decodificar_cursor(depois)
+    if posicao:
+        criado_em, ticket_id = posicao
+        consulta = consulta.filter(or_(
+            Ticket.criado_em < criado_em,
+            and_(Ticket.criado_em == criado_em, Ticket.id < ticket_id),
+        ))
+
+    # Busca um a mais só para saber se existe próxima página
+    tickets = (
+        consulta.order_by(Ticket.criado_em.desc(), Ticket.id.desc())
+        .limit(por_pagina + 1)
+        .all()
+    )
+    proximo_cursor = None
+    if len(tickets) > por_pagina:
+        tickets = tickets[:por_pagina]
+        proximo_cursor = codificar_cursor(tickets[-1])
+    return tickets, proximo_cursor
+
+
+def buscar_ticket(usuario_id, ticket_id):
+    """Busca um ticket pela chave primária. Retorna None se não for do usuário."""
+    ticket = db_session.get(Ticket, ticket_id)
+    if ticket is None or ticket.usuario_id != usuario_id:
+        return None
+    return ticket
+
+
+def _contagens(usuario_id):
+    """
+    Subconsulta de uma linha com o total de tickets do usuário em cada status.
+    - SQLite/MySQL: lê 'ticket_contagens' (mantida por triggers), custo fixo.
+    - Outros bancos: soma condicional sobre o índice (usuario_id, status, ...).
+    """
+    if contagens_automaticas(db_session.get_bind().dialect.name):
+        origem, valor = TicketContagem, TicketContagem.total
+    else:
+        origem, valor = Ticket, 1
+    return (
+        select(*[
+            func.coalesce(func.sum(case((origem.status == chave, valor), else_=0)), 0).label(chave)
+            for chave in STATUS_TICKET
+        ])
+        .where(origem.usuario_id == usuario_id)
+        .subquery("contagens")
+    )
+
+
+def resumo_painel(usuario_id, recentes=RECENTES_PAINEL):
+    """
+    Dados do painel em uma ida ao banco:
+    - o usuário (PerfilUsuario: id, nome, email, 2FA);
+    - quantos tickets ele tem em cada status (veja _contagens);
+    - os `recentes` tickets mais novos (índice (usuario_id, criado_em, id)).
+    Retorna ResumoPainel, ou None se o usuário não existir.
+    """
+    contagens = _contagens(usuario_id)
+    ultimos = (
+        select(Ticket.id, Ticket.assunto, Ticket.status, Ticket.criado_em)
+        .where(Ticket.usuario_id == usuario_id)
+        .order_by(Ticket.criado_em.desc(), Ticket.id.desc())
+        .limit(recentes)
+        .subquery("ultimos")
+    )
+    # Uma linha por ticket recente (ou uma só, com os campos do ticket
+    # vazios, se ele não tiver nenhum); usuário e contagens se repetem.
+    linhas = db_session.execute(
+        select(
+            *COLUNAS_PERFIL,
+            *[contagens.c[chave] for chave in STATUS_TICKET],
+            ultimos.c.id.label("ticket_id"), ultimos.c.assunto, ultimos.c.status, ultimos.c.criado_em,
+        )
+        .select_from(Usuario)
+        .join(contagens, true())
+        .outerjoin(ultimos, true())
+        .where(Usuario.id == usuario_id, Usuario.excluido_em.is_(None))
+        .order_by(ultimos.c.criado_em.desc(), ultimos.c.id.desc())
+    ).all()
+    if not linhas:
+        return None
+
+    primeira = linhas[0]
+    usuario = PerfilUsuario(*primeira[:len(PerfilUsuario._fields)])
+    total_por_status = {chave: int(primeira._mapping[chave]) for chave in STATUS_TICKET}
+    tickets = [
+        {
+            "id": linha.ticket_id,
+            "assunto": linha.assunto,
+            "status": linha.status,
+            "status_label": STATUS_TICKET.get(linha.status, linha.status),
+            "criado_em": linha.criado_em,
+        }
+        for linha in linhas if linha.ticket_id is not None
+    ]
+    return ResumoPainel(usuario, total_por_status, tickets)
@@ -0,0 +1,116 @@
+"""
+2FA por aplicativo autenticador (TOTP, RFC 6238).
+
+No 2FA por e-mail, cada login gera um código, guarda em codigos_2fa e
+envia um e-mail. Com TOTP, o servidor e o aplicativo (Google
+Authenticator, Authy, ...) calculam o mesmo código de 6 dígitos a partir
+de um segredo compartilhado e do relógio:
+- nada é enviado e nada é guardado por login: basta o segredo do usuário;
+- aceita o código do passo atual e de TOTP_JANELA passos antes/depois
+  (relógio do celular um pouco adiantado ou atrasado);
+- cada código vale uma vez só: o último passo usado fica no banco
+  (totp_ultimo_passo) e comando_uso() só o avança com um UPDATE
+  condicional. Se duas requisições mandarem o mesmo código ao mesmo
+  tempo, só uma altera a linha.
+
+Só usa a biblioteca padrão. O QR code da página de configurações é
+opcional (pip install qrcode); sem ele, o usuário digita a chave.
+"""
+from urllib.parse import quote, urlencode
+from sqlalchemy import update, or_
+from database import Usuario
+from dotenv import load_dotenv
+import base64
+import hashlib
+import hmac
+import secrets
+import struct
+import time
+import os
+
+try:
+    import qrcode  # opcional: pip install qrcode
+    import qrcode.image.svg
+except ImportError:
+    qrcode = None
+
+load_dotenv()
+
+TOTP_PERIODO = 30  # segundos por código (padrão dos aplicativos)
+TOTP_DIGITOS = 6
+TOTP_JANELA = int(os.getenv("TOTP_JANELA", 1))  # passos de tolerância para cada lado
+TOTP_EMISSOR = os.getenv("TOTP_EMISSOR", "Suporte Técnico")  # nome mostrado no aplicativo
+
+
+def gerar_segredo():
+    """Segredo novo de 160 bits, em base32 (o formato que os aplicativos leem)."""
+    return base64.b32encode(secrets.token_bytes(20)).decode("ascii")
+
+
+def passo_atual(agora=None):
+    """Número do intervalo de TOTP_PERIODO segundos desde 1970."""
+    return int((time.time() if agora is None else agora) // TOTP_PERIODO)
+
+
+def codigo(segredo, passo):
+    """Código do passo (HOTP, RFC 4226, com HMAC-SHA1)."""
+    chave = base64.b32decode(segredo + "=" * (-len(segredo) % 8), casefold=True)
+    resumo = hmac.new(chave, struct.pack(">Q", passo), hashlib.sha1).digest()
+    deslocamento = resumo[-1] & 0x0F
+    numero = struct.unpack(">I", resumo[deslocamento:deslocamento + 4])[0] & 0x7FFFFFFF
+    return f"{numero % 10 ** TOTP_DIGITOS:0{TOTP_DIGITOS}d}"
+
+
+def verificar(segredo, codigo_digitado, ultimo_passo=None, agora=None):
+    """
+    Retorna o passo do código, se ele bater com algum passo da janela e for
+    posterior a `ultimo_passo`; senão None. Não grava nada: depois chame
+    comando_uso() para consumir o código.
+    """
+    codigo_digitado = (codigo_digitado or "").strip().replace(" ", "")
+    if not segredo or len(codigo_digitado) != TOTP_DIGITOS or not codigo_digitado.isdigit():
+        return None
+    atual = passo_atual(agora)
+    for passo in range(atual - TOTP_JANELA, atual + TOTP_JANELA + 1):
+        if ultimo_passo is not None and passo <= ultimo_passo:
+            continue
+        # compare_digest: o tempo da comparação não revela quantos dígitos acertaram
+        if hmac.compare_digest(codigo(segredo, passo), codigo_digitado):
+            return passo
+    return None
+
+
+def comando_uso(usuario_id, passo):
+    """
+    UPDATE que marca o passo como usado, só se ele for maior que o último.
+    Execute e confira rowcount == 1: 0 significa que o código já foi usado
+    (replay ou duas requisições simultâneas).
+    """
+    return (
+        update(Usuario)
+        .where(
+            Usuario.id == usuario_id,
+            or_(Usuario.totp_ultimo_passo.is_(None), Usuario.totp_ultimo_passo < passo),
+        )
+        .values(totp_ultimo_passo=passo)
+    )
+
+
+def uri_provisionamento(segredo, email):
+    """URI otpauth:// que o aplicativo lê pelo QR code."""
+    rotulo = quote(f"{TOTP_EMISSOR}:{email}")
+    parametros = urlencode({
+        "secret": segredo,
+        "issuer": TOTP_EMISSOR,
+        "digits": TOTP_DIGITOS,
+        "period": TOTP_PERIODO,
+    })
+    return f"otpauth://totp/{rotulo}?{parametros}"
+
+
+def qr_svg(uri):
+    """QR code da URI em SVG (para pôr direto no HTML), ou None sem o pacote qrcode."""
+    if qrcode is None:
+        return None
+    imagem = qrcode.make(uri, image_factory=qrcode.image.svg.SvgPathImage, box_size=8)
+    return imagem.to_string(encoding="unicode")
@@ -0,0 +1,212 @@
+"""
+Importação e exportação de usuários em lote.
+
+Comandos (registrados no app pelo main.py):
+    flask --app main importar-usuarios usuarios.json [--lote 1000] [--conflito pular|atualizar]
+    flask --app main exportar-usuarios saida.csv
+
+- Lê JSON (lista ou JSON Lines) ou CSV em streaming, sem carregar o arquivo
+  inteiro na memória.
+- Insere em lotes com um único INSERT multi-linha (executemany) por lote.
+- Descarta registros incompletos ou com e-mail inválido (validacao.py).
+- Remove e-mails repetidos dentro do lote (comparando em minúsculas).
+- Conflito com e-mail já cadastrado: "pular" (padrão) ou "atualizar".
+- Os hashes bcrypt são gravados como vieram; nada é recalculado.
+"""
+from sqlalchemy import select, func
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from database import Usuario, obter_engine
+from validacao import validar_varios
+import click
+import json
+import csv
+import os
+
+LOTE_PADRAO = 1000
+CAMPOS = ["nome", "email", "hash_senha", "twofa_ativo"]
+
+
+# ---------------- LEITURA EM STREAMING -----------------
+def _ler_json(arquivo, tamanho_bloco=64 * 1024):
+    """
+    Lê objetos de um arquivo JSON aos poucos.
+    Aceita uma lista `[{...}, {...}]` ou um objeto por linha (JSON Lines).
+    """
+    decoder = json.JSONDecoder()
+    separadores = " \t\r\n,[]"
+    buffer = ""
+    pos = 0
+    fim = False
+    while True:
+        # Pula espaços e os separadores da lista
+        while pos < len(buffer) and buffer[pos] in separadores:
+            pos += 1
+        if pos < len(buffer):
+            try:
+                objeto, pos = decoder.raw_decode(buffer, pos)
+                yield objeto
+                continue
+            except json.JSONDecodeError:
+                if fim:
+                    raise
+                # Objeto incompleto: precisa ler mais um bloco
+        elif fim:
+            return
+        bloco = arquivo.read(tamanho_bloco)
+        fim = not bloco
+        buffer = buffer[pos:] + bloco
+        pos = 0
+
+
+def ler_usuarios(caminho):
+    """Gera dicts de usuário a partir de um .json/.jsonl ou .csv."""
+    with open(caminho, encoding="utf-8", newline="") as arquivo:
+        if caminho.lower().endswith(".csv"):
+            yield from csv.DictReader(arquivo)
+        else:
+            yield from _ler_json(arquivo)
+
+
+def _normalizar(registro):
+    """Limpa um registro lido. Retorna None se estiver incompleto."""
+    nome = (registro.get("nome") or "").strip()
+    email = (registro.get("email") or "").strip().lower()
+    hash_senha = (registro.get("hash_senha") or "").strip()
+    if not nome or not email or not hash_senha.startswith("$2"):
+        return None
+    try:
+        twofa_ativo = int(registro.get("twofa_ativo") or 0)
+    except (TypeError, ValueError):  # "sim", "true"... descarta como os outros inválidos
+        return None
+    return {
+        "nome": nome[:50],
+        "email": email,
+        "hash_senha": hash_senha,
+        "twofa_ativo": twofa_ativo,
+    }
+
+
+def _em_lotes(registros, tamanho, manter_ultimo):
+    """
+    Agrupa em lotes sem e-mails repetidos.
+    Retorna (lote, descartados) a cada lote.
+    """
+    lote = {}
+    descartados = 0
+    for dados, erros in validar_varios(map(_normalizar, registros)):
+        if erros:  # incompleto ou e-mail inválido
+            descartados += 1
+            continue
+        if dados["email"] in lote:
+            descartados += 1
+            if not manter_ultimo:
+                continue
+        lote[dados["email"]] = dados
+        if len(lote) >= tamanho:
+            yield list(lote.values()), descartados
+            lote, descartados = {}, 0
+    if lote or descartados:
+        yield list(lote.values()), descartados
+
+
+# ---------------- IMPORTAÇÃO -----------------
+def _comando_insert(dialeto, conflito):
+    """INSERT com tratamento de e-mail duplicado para o banco em uso."""
+    tabela = Usuario.__table__
+    if dialeto == "mysql":
+        stmt = mysql_insert(tabela)
+        if conflito == "atualizar":
+            return stmt.on_duplicate_key_update(nome=stmt.inserted.nome, hash_senha=stmt.inserted.hash_senha)
+        return stmt.prefix_with("IGNORE")
+    if dialeto == "sqlite":
+        stmt = sqlite_insert(tabela)
+        if conflito == "atualizar":
+            return stmt.on_conflict_do_update(
+                index_elements=["email"],
+                set_={"nome": stmt.excluded.nome, "hash_senha": stmt.excluded.hash_senha},
+            )
+        return stmt.on_conflict_do_nothing(index_elements=["email"])
+    raise click.ClickException(f"Banco '{dialeto}' não suportado na importação em lote.")
+
+
+def importar_usuarios(caminho, tamanho_lote=LOTE_PADRAO, conflito="pular"):
+    """
+    Importa os usuários do arquivo. Cada lote é uma transação.
+    Retorna um dict com o resumo (enviados, inseridos, descartados).
+    """
+    engine = obter_engine()
+    stmt = _comando_insert(engine.dialect.name, conflito)
+    contar = select(func.count()).select_from(Usuario.__table__)
+
+    enviados = descartados = 0
+    with engine.connect() as conexao:
+        antes = conexao.execute(contar).scalar()
+    for lote, descartados_lote in _em_lotes(ler_usuarios(caminho), tamanho_lote, conflito == "atualizar"):
+        descartados += descartados_lote
+        if not lote:
+            continue
+        with engine.begin() as conexao:
+            conexao.execute(stmt, lote)  # lista de dicts → executemany
+        enviados += len(lote)
+    with engine.connect() as conexao:
+        depois = conexao.execute(contar).scalar()
+
+    return {"enviados": enviados, "inseridos": depois - antes, "descartados": descartados}
+
+
+# ---------------- EXPORTAÇÃO -----------------
+def exportar_usuarios(caminho, tamanho_lote=LOTE_PADRAO):
+    """Grava os usuários ativos em .csv ou .json, lendo o banco em blocos."""
+    tabela = Usuario.__table__
+    consulta = (
+        select(tabela.c.nome, tabela.c.email, tabela.c.hash_senha, tabela.c.twofa_ativo)
+        .where(tabela.c.excluido_em.is_(None))  # contas excluídas aguardando a purga ficam de fora
+        .order_by(tabela.c.id)
+    )
+    total = 0
+    with obter_engine().connect() as conexao, open(caminho, "w", encoding="utf-8", newline="") as arquivo:
+        linhas = conexao.execution_options(yield_per=tamanho_lote).execute(consulta)
+        if caminho.lower().endswith(".csv"):
+            escritor = csv.DictWriter(arquivo, fieldnames=CAMPOS)
+            escritor.writeheader()
+            for linha in linhas:
+                escritor.writerow(dict(linha._mapping))
+                total += 1
+        elif caminho.lower().endswith(".jsonl"):
+            for linha in linhas:
+                arquivo.write(json.dumps(dict(linha._mapping), ensure_ascii=False) + "\n")
+                total += 1
+        else:
+            arquivo.write("[\n")
+            for linha in linhas:
+                if total:
+                    arquivo.write(",\n")
+                arquivo.write("    " + json.dumps(dict(linha._mapping), ensure_ascii=False))
+                total += 1
+            arquivo.write("\n]\n")
+    return total
+
+
+# ---------------- COMANDOS -----------------
+def registrar_comandos(app):
+    """Registra `flask importar-usuarios` e `flask exportar-usuarios`."""
+
+    @app.cli.command("importar-usuarios")
+    @click.argument("caminho", type=click.Path(exists=True, dir_okay=False))
+    @click.option("--lote", default=LOTE_PADRAO, show_default=True, help="Usuários por INSERT.")
+    @click.option("--conflito", type=click.Choice(["pular", "atualizar"]), default="pular", show_default=True,
+                  help="O que fazer quando o e-mail já existe no banco.")
+    def comando_importar(caminho, lote, conflito):
+        """Importa usuários de um arquivo JSON, JSON Lines ou CSV."""
+        resumo = importar_usuarios(caminho, lote, conflito)
+        print(f"✅ Importação concluída: {resumo['inseridos']} novos, "
+              f"{resumo['enviados']} enviados ao banco, {resumo['descartados']} descartados "
+              f"(inválidos ou repetidos no arquivo).")
+
+    @app.cli.command("exportar-usuarios")
+    @click.argument("caminho", type=click.Path(dir_okay=False))
+    def comando_exportar(caminho):
+        """Exporta os usuários para .csv, .json ou .jsonl."""
+        total = exportar_usuarios(caminho)
+        print(f"✅ {total} usuários exportados para {os.path.basename(caminho)}.")
@@ -0,0 +1,79 @@
+"""
+Validação de e-mail e senha, usada no cadastro web, no cadastro pelo
+terminal e na importação em lote.
+
+- Os padrões são compilados uma vez, na importação do módulo.
+- Antes da regex vem uma checagem barata de tamanho e de caracteres, que
+  descarta entradas absurdas (ex.: um e-mail de 1 MB) sem rodar a regex.
+- As funções erros_*() devolvem a lista de TODAS as regras que falharam,
+  para o usuário corrigir tudo de uma vez.
+- validar_varios() valida muitos registros em sequência (streaming).
+"""
+import re
+
+EMAIL_TAMANHO_MAX = 50   # mesmo tamanho da coluna usuarios.email
+SENHA_TAMANHO_MIN = 8
+SENHA_TAMANHO_MAX = 72   # bytes: o bcrypt ignora (ou recusa) o que passar disso
+SENHA_ESPECIAIS = "@#$%&*!?"
+
+PADRAO_EMAIL = re.compile(r"[\w\.-]+@[\w\.-]+\.\w+")
+PADRAO_SENHA = re.compile(r"(?=.*[a-z])(?=.*[A-Z])(?=.*\d)(?=.*[@#$%&*!?]).{8,}")
+
+# Regras da senha, checadas uma a uma só quando o padrão completo falha
+_REGRAS_SENHA = (
+    (re.compile(r"[A-Z]"), "Uma letra maiúscula"),
+    (re.compile(r"[a-z]"), "Uma letra minúscula"),
+    (re.compile(r"\d"), "Um número"),
+    (re.compile(r"[@#$%&*!?]"), f"Um caractere especial ({SENHA_ESPECIAIS})"),
+)
+
+ERRO_EMAIL = "E-mail inválido! (Ex: usuario@dominio.com)"
+ERRO_EMAIL_LONGO = f"E-mail muito longo (máximo {EMAIL_TAMANHO_MAX} caracteres)."
+ERRO_SENHA_CURTA = f"Pelo menos {SENHA_TAMANHO_MIN} caracteres"
+ERRO_SENHA_LONGA = f"No máximo {SENHA_TAMANHO_MAX} bytes"
+ERRO_SENHA_LINHA = "Sem quebras de linha"
+ERRO_REGISTRO_VAZIO = "Registro vazio ou incompleto."
+
+
+def erros_email(email):
+    """Lista de problemas do e-mail (vazia se estiver válido)."""
+    if len(email) > EMAIL_TAMANHO_MAX:
+        return [ERRO_EMAIL_LONGO]
+    if email.count("@") != 1 or not PADRAO_EMAIL.fullmatch(email):
+        return [ERRO_EMAIL]
+    return []
+
+
+def erros_senha(senha):
+    """Lista das regras de senha que não foram atendidas (vazia se ok)."""
+    tamanho_ok = SENHA_TAMANHO_MIN <= len(senha) and len(senha.encode("utf-8")) <= SENHA_TAMANHO_MAX
+    if tamanho_ok and PADRAO_SENHA.fullmatch(senha):
+        return []
+
+    erros = []
+    if len(senha) < SENHA_TAMANHO_MIN:
+        erros.append(ERRO_SENHA_CURTA)
+    elif len(senha.encode("utf-8")) > SENHA_TAMANHO_MAX:
+        erros.append(ERRO_SENHA_LONGA)
+    if "\n" in senha or "\r" in senha:
+        erros.append(ERRO_SENHA_LINHA)
+    erros.extend(mensagem for padrao, mensagem in _REGRAS_SENHA if not padrao.search(senha))
+    return erros
+
+
+def validar_varios(registros):
+    """
+    Valida vários registros (dicts) em sequência, sem carregar todos na memória.
+    - Só os campos presentes ("email", "senha") são checados.
+    - Gera (registro, erros) na mesma ordem da entrada.
+    """
+    for registro in registros:
+        if not registro:
+            yield registro, [ERRO_REGISTRO_VAZIO]
+            continue
+        erros = []
+        if "email" in registro:
+            erros.extend(erros_email(registro["email"]))
+        if "senha" in registro:
+            erros.extend(erros_senha(registro["senha"]))
+        yield registro, erros